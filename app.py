@@ -1,14 +1,46 @@
-from flask import Flask, jsonify, render_template
+from flask import Flask, Response, jsonify, render_template, request
+from flask.json.provider import JSONProvider
+import orjson
+import hashlib
+from itertools import repeat
 import pandas as pd
 import numpy as np
 import os
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+class OrjsonProvider(JSONProvider):
+    """使用 orjson 的 JSON Provider，直接输出 bytes 并原生支持 NumPy 类型"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=str, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj,
+                                                     default=str,
+                                                     option=ORJSON_OPTIONS),
+                                        mimetype='application/json')
+
+
 # 全局变量，用于在启动时加载轨迹数据
 trajectory_data = None
+# 轨迹数据在启动后不再变化，序列化结果只需计算一次
+_cached_response_bytes = None
+_cached_etag = None
+_cached_error = None
+# 可序列化的数值列名，随数据集固定，加载时确定一次
+_numeric_keys = ()
 
 
 def create_app():
     """创建并配置 Flask 应用实例"""
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
 
     @app.route('/')
     def index():
@@ -27,128 +59,173 @@ def create_app():
     @app.route('/api/trajectory')
     def get_trajectory_data():
         """提供轨迹数据的 API 接口"""
-        if not trajectory_data:
+        if _cached_error is not None:
+            return jsonify({"error": _cached_error}), 500
+        if _cached_response_bytes is None:
             return jsonify({"error": "Trajectory data not loaded"}), 500
 
-        # 将 Trajectory 对象转换为可序列化的 JSON 格式
+        if _cached_etag in request.if_none_match:
+            return Response(status=304)
+        response = Response(_cached_response_bytes,
+                            mimetype='application/json')
+        response.set_etag(_cached_etag)
+        return response
+
+    return app
+
+
+def get_numeric_keys(traj):
+    """返回轨迹中除经纬度外的数值型数据列名"""
+    if not len(traj):
+        return ()
+    return tuple(k for k, v in traj[0].data.items()
+                 if isinstance(v, (int, float, np.number))
+                 and k not in ('latitude', 'longitude'))
+
+
+def iter_response_chunks(traj, numeric_keys):
+    """
+    将 Trajectory 对象逐块序列化为 JSON 字节 (CZML + ECharts)。
+    CZML 实体逐条生成并立即序列化，不在内存中保留完整的字典结构。
+    """
+    lats = traj['latitude']
+    lons = traj['longitude']
+    timestamps_pd = pd.to_datetime(traj['timestamp'])
+
+    other_data = {}
+    for key in numeric_keys:
         try:
-            lats = trajectory_data['latitude']
-            lons = trajectory_data['longitude']
-            timestamps_pd = pd.to_datetime(trajectory_data['timestamp'])
-
-            other_data = {}
-            if trajectory_data.traj_points:
-                sample_data = trajectory_data.traj_points[0].data
-                keys_to_extract = [
-                    k for k, v in sample_data.items()
-                    if isinstance(v, (int, float, np.number))
-                    and k not in ['latitude', 'longitude']
-                ]
-                for key in keys_to_extract:
-                    try:
-                        other_data[key] = trajectory_data[key].tolist()
-                    except (KeyError, AttributeError):
-                        print(
-                            f"Warning: Could not serialize data for key '{key}'. Skipping."
-                        )
-
-            # 准备 ECharts 数据
-            echarts_timestamps = [
-                ts.strftime('%Y-%m-%d %H:%M:%S') for ts in timestamps_pd
-            ]
-            echarts_series = []
-            for key, values in other_data.items():
-                # replace all np.nan in values with None for JSON serialization
-                values = [None if np.isnan(v) else v for v in values]
-                echarts_series.append({
-                    "title": key.replace('_', ' ').title(),
-                    "data": values
-                })
-            # 准备 CZML 数据
-            start_time_iso = timestamps_pd.min().to_pydatetime().isoformat(
-            ) + "Z"
-            end_time_iso = timestamps_pd.max().to_pydatetime().isoformat(
-            ) + "Z"
-
-            czml = [{
-                "id": "document",
-                "name": "ShipTrack",
-                "version": "1.0",
-                "clock": {
-                    "interval": f"{start_time_iso}/{end_time_iso}",
-                    "currentTime": start_time_iso,
-                    "multiplier": 3600  # 调整时钟速度
-                }
-            }]
-
-            # 路径实体
-            czml.append({
-                "id": "shipPath",
-                "name": "Ship Trajectory",
-                "path": {
-                    "material": {
-                        "solidColor": {
-                            "color": {
-                                "rgba": [0, 255, 255, 180]
-                            }
-                        }
-                    },
-                    "width": 3,
-                    "leadTime": 0,
-                    "trailTime": 86400 * len(lats),
-                    "resolution": 5
-                }
-            })
-            # 点实体
-
-            for i, ts in enumerate(timestamps_pd):
-                point_id = f"point_{i}"
-                if np.isnan(lons[i]) or np.isnan(lats[i]):
-                    print(
-                        f"Warning: Skipping point {i} with invalid coordinates."
-                    )
-                    continue
-
-                point_properties = {
-                    'timestamp_iso': ts.to_pydatetime().isoformat() + "Z"
-                }
-                point_properties['id'] = point_id
-                point_properties['latitude'] = lats[i]
-                point_properties['longitude'] = lons[i]
-                for key in other_data:
-                    if np.isnan(other_data[key][i]):
-                        continue
-                    point_properties[key] = other_data[key][i]
-
-                czml.append({
-                    "id": point_id,
-                    "name": f"Track Point {i}",
-                    "position": {
-                        "cartographicDegrees": [lons[i], lats[i], 100]
-                    },
-                    "properties": point_properties
-                })
-
-            czml[1]["position"] = {"reference": "point_0#position"}
-
-            # 将所有数据打包在一个 JSON 对象中返回
-            response_data = {
-                "czml": czml,
-                "echarts": {
-                    "timestamps": echarts_timestamps,
-                    "series": echarts_series
+            col = np.asarray(traj[key])
+            # 整数列 (如 sail_state) 保持整数，避免在 JSON 中输出为 1.0
+            if col.dtype.kind not in 'iub':
+                col = col.astype(np.float64)
+            other_data[key] = col
+        except (KeyError, AttributeError):
+            print(
+                f"Warning: Could not serialize data for key '{key}'. Skipping."
+            )
+
+    # 各列只转换一次为 Python 列表，ECharts 与 CZML 共用
+    other_lists = {key: arr.tolist() for key, arr in other_data.items()}
+
+    # 准备 ECharts 数据
+    # 一次性向量化格式化时间戳，避免逐元素调用 strftime
+    ts_idx = pd.DatetimeIndex(timestamps_pd)
+    echarts_timestamps = ts_idx.strftime('%Y-%m-%d %H:%M:%S').tolist()
+    iso_z = (ts_idx.strftime('%Y-%m-%dT%H:%M:%S') + 'Z').tolist()
+    echarts_series = []
+    for key, values in other_lists.items():
+        # orjson 会将 NaN 序列化为 null，无需逐元素替换
+        echarts_series.append({
+            "title": key.replace('_', ' ').title(),
+            "data": values
+        })
+    # 准备 CZML 数据
+    # DatetimeIndex.min/max 会跳过 NaT
+    start_time_iso = np.datetime_as_string(ts_idx.min().to_datetime64(),
+                                           unit='s') + "Z"
+    end_time_iso = np.datetime_as_string(ts_idx.max().to_datetime64(),
+                                         unit='s') + "Z"
+
+    document = {
+        "id": "document",
+        "name": "ShipTrack",
+        "version": "1.0",
+        "clock": {
+            "interval": f"{start_time_iso}/{end_time_iso}",
+            "currentTime": start_time_iso,
+            "multiplier": 3600  # 调整时钟速度
+        }
+    }
+
+    # 路径实体
+    ship_path = {
+        "id": "shipPath",
+        "name": "Ship Trajectory",
+        "path": {
+            "material": {
+                "solidColor": {
+                    "color": {
+                        "rgba": [0, 255, 255, 180]
+                    }
                 }
+            },
+            "width": 3,
+            "leadTime": 0,
+            "trailTime": 86400 * len(lats),
+            "resolution": 5
+        },
+        "position": {
+            "reference": "point_0#position"
+        }
+    }
+    echarts = {"timestamps": echarts_timestamps, "series": echarts_series}
+
+    yield b'{"czml":['
+    yield orjson.dumps(document, option=ORJSON_OPTIONS)
+    yield b',' + orjson.dumps(ship_path, option=ORJSON_OPTIONS)
+
+    # 点实体
+    # NaN 掩码按列一次性预先计算，逐点循环中只做列表读取
+    lats_a = np.asarray(lats, dtype=np.float64)
+    lons_a = np.asarray(lons, dtype=np.float64)
+    invalid = (np.isnan(lats_a) | np.isnan(lons_a)).tolist()
+    lats_l = lats_a.tolist()
+    lons_l = lons_a.tolist()
+    keys = list(other_lists)
+    # 整数列不含 NaN，掩码全为 False
+    nan_masks = [
+        np.isnan(other_data[k]).tolist()
+        if other_data[k].dtype.kind == 'f' else [False] * len(lats_l)
+        for k in keys
+    ]
+    ids = [f"point_{i}" for i in range(len(lats_l))]
+    # 没有其他数据列时 zip(*[]) 为空，以空元组补齐
+    values = zip(*[other_lists[k] for k in keys]) if keys else repeat(())
+    missing = zip(*nan_masks) if keys else repeat(())
+
+    for i, (pid, iso, lat, lon, bad, vals, nans) in enumerate(
+            zip(ids, iso_z, lats_l, lons_l, invalid, values, missing)):
+        if bad:
+            print(f"Warning: Skipping point {i} with invalid coordinates.")
+            continue
+        point = {
+            "id": pid,
+            "name": f"Track Point {i}",
+            "position": {
+                "cartographicDegrees": [lon, lat, 100]
+            },
+            "properties": {
+                'timestamp_iso': iso,
+                'id': pid,
+                'latitude': lat,
+                'longitude': lon,
+                **{k: v
+                   for k, v, nan in zip(keys, vals, nans) if not nan}
             }
-            return jsonify(response_data)
+        }
+        yield b',' + orjson.dumps(point, option=ORJSON_OPTIONS)
+    yield b'],"echarts":'
+    yield orjson.dumps(echarts, option=ORJSON_OPTIONS)
+    yield b'}'
 
-        except Exception as e:
-            print(f"Error serializing data: {e}")
-            return jsonify({"error": str(e)}), 500
 
-    return app
+def build_response(traj, numeric_keys) -> bytes:
+    """将 Trajectory 对象序列化为完整的 API 响应字节"""
+    return b''.join(iter_response_chunks(traj, numeric_keys))
 
 
 def set_trajectory_data(data):
-    """全局设置轨迹数据，供 API 使用"""
-    global trajectory_data
+    """全局设置轨迹数据，并预先序列化 API 响应"""
+    global trajectory_data, _numeric_keys
+    global _cached_response_bytes, _cached_etag, _cached_error
     trajectory_data = data
+    _cached_response_bytes, _cached_etag, _cached_error = None, None, None
+    try:
+        _numeric_keys = get_numeric_keys(data)
+        _cached_response_bytes = build_response(data, _numeric_keys)
+        _cached_etag = hashlib.blake2b(_cached_response_bytes,
+                                       digest_size=8).hexdigest()
+    except Exception as e:
+        print(f"Error serializing data: {e}")
+        _cached_error = str(e)
@@ -1,12 +1,19 @@
 import warnings
 import sys
-from rich import print
-from rich.console import Console
-from rich.panel import Panel
-from rich.text import Text
 
-# 创建一个 Rich Console 实例，用于输出
-console = Console(file=sys.stderr)  # 警告通常输出到 stderr
+# 同一条警告只显示一次，避免在逐点循环中反复渲染
+warnings.simplefilter('once')
+
+# Rich Console 实例延迟创建，只有需要格式化输出时才导入 rich
+_console = None
+
+
+def _get_console():
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console(file=sys.stderr)  # 警告通常输出到 stderr
+    return _console
 
 
 def custom_showwarning(message,
@@ -17,7 +24,17 @@ def custom_showwarning(message,
                        line=None):
     """
     自定义的警告显示函数，使用 rich 进行格式化。
+    非交互式终端下退化为普通文本输出。
     """
+    if not sys.stderr.isatty():
+        sys.stderr.write(
+            warnings.formatwarning(message, category, filename, lineno,
+                                   line))
+        return
+
+    from rich.panel import Panel
+    from rich.text import Text
+
     # 格式化警告信息
     warning_text = Text()
     warning_text.append(f"{category.__name__}: ", style="bold yellow")
@@ -35,7 +52,7 @@ def custom_showwarning(message,
     )
 
     # 将 Panel 打印到控制台
-    console.print(warning_panel)
+    _get_console().print(warning_panel)
 
 
 # 替换 warnings 模块的 showwarning 函数
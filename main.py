@@ -18,7 +18,10 @@ def validclipper(data: np.ndarray, range: tuple = (0, 20000)) -> np.ndarray:
     :param x: Input data array.
     :return: Clipped data array.
     """
-    return np.where((data < range[0]) | (data > range[1]), np.nan, data)
+    lo, hi = range
+    out = np.array(data, dtype=np.float64)
+    out[(out < lo) | (out > hi)] = np.nan
+    return out
 
 
 chunk = DataChunk(path,
@@ -34,8 +37,9 @@ chunk = DataChunk(path,
 traj = Trajectory(Datachunk=chunk)
 traj.setwinddata('./data/brazil.grib', engine='cfgrib')
 sensor_wind = traj['true_wind_speed'] * 0.5144
-sensor_wind_direction = traj['true_wind_direction']
-sensor_wind_direction = (sensor_wind_direction + 180) % 360
+# 一次加法生成新数组，再原地取模，避免多余的临时数组（且不改动 traj 中的原始列）
+sensor_wind_direction = traj['true_wind_direction'] + 180
+np.mod(sensor_wind_direction, 360, out=sensor_wind_direction)
 u10 = traj['u10']
 v10 = traj['v10']
 u100 = traj['u100']
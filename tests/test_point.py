@@ -0,0 +1,83 @@
+import unittest
+
+import numpy as np
+import xarray as xr
+
+from track.point import TrajPoint
+
+
+def _env():
+    """Wind components that vary linearly in time, latitude and longitude."""
+    time = np.array(['2024-01-01T00', '2024-01-01T06'], dtype='datetime64[ns]')
+    lat = np.arange(29.0, 33.0)
+    lon = np.arange(119.0, 123.0)
+    t, y, x = np.meshgrid(np.arange(2.0), lat, lon, indexing='ij')
+    return xr.Dataset(
+        {
+            'u10': (('time', 'latitude', 'longitude'), t + y),
+            'v10': (('time', 'latitude', 'longitude'), t - x),
+            'u100': (('time', 'latitude', 'longitude'), 2 * y),
+            'v100': (('time', 'latitude', 'longitude'), -2 * x),
+        },
+        coords={
+            'time': time,
+            'latitude': lat,
+            'longitude': lon
+        })
+
+
+class FollowBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parents = [
+            TrajPoint({
+                'latitude': 30.0,
+                'longitude': 120.0
+            }, np.datetime64('2024-01-01T00:00:00', 's')),
+            TrajPoint({
+                'latitude': 31.0,
+                'longitude': 121.0
+            }, np.datetime64('2024-01-01T00:00:10', 's')),
+        ]
+
+    def test_fractional_dt_moves_timestamp(self):
+        nodes = TrajPoint.follow_batch(self.parents, [0.0, 0.0], dt=0.5)
+        self.assertEqual(
+            [node.timestamp for node in nodes],
+            [
+                np.datetime64('2024-01-01T00:00:00.500'),
+                np.datetime64('2024-01-01T00:00:10.500')
+            ])
+
+    def test_per_node_dt(self):
+        nodes = TrajPoint.follow_batch(self.parents, [0.0, 0.0],
+                                       dt=[1.25, 60])
+        self.assertEqual(nodes[0].timestamp,
+                         np.datetime64('2024-01-01T00:00:01.250'))
+        self.assertEqual(nodes[1].timestamp,
+                         np.datetime64('2024-01-01T00:01:10'))
+
+    def test_nodes_import_env(self):
+        env = _env()
+        for parent in self.parents:
+            parent.envdata = env
+        nodes = TrajPoint.follow_batch(self.parents, [0.0, 0.0], dt=60)
+        for node in nodes:
+            expected = TrajPoint(node.location, node.timestamp)
+            expected.envdata = env
+            expected.importEnv()
+            np.testing.assert_allclose(
+                [node.u10, node.v10, node.u100, node.v100],
+                [expected.u10, expected.v10, expected.u100, expected.v100])
+            self.assertAlmostEqual(node.data['w10'], expected.data['w10'])
+            node.useEnv(warning=False)
+            self.assertEqual(node.wind_u, node.u10)
+
+    def test_env_slots_start_unset(self):
+        point = self.parents[0]
+        self.assertIsNone(point.u10)
+        self.assertIsNone(point.v100)
+
+
+if __name__ == '__main__':
+    unittest.main()
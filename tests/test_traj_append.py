@@ -0,0 +1,39 @@
+import unittest
+import warnings
+
+import numpy as np
+
+from track.point import TrajPoint
+from track.traj import Trajectory
+
+
+def _point(minute, **data):
+    return TrajPoint({
+        'latitude': 30.0,
+        'longitude': 120.0
+    }, np.datetime64(f'2024-01-01T00:{minute:02d}'), data)
+
+
+class TrajAppendTest(unittest.TestCase):
+
+    def setUp(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            self.traj = Trajectory()
+
+    def test_new_key_is_backfilled(self):
+        self.traj.append(_point(0))
+        self.traj.append(_point(1, speed=5.0, tag='a'))
+        self.traj.append(_point(2))
+
+        np.testing.assert_array_equal(self.traj['speed'], [np.nan, 5.0, np.nan])
+        self.assertEqual(self.traj['tag'].tolist(), [None, 'a', None])
+        self.assertEqual(len(self.traj['timestamp']), 3)
+
+    def test_first_point_keeps_its_data(self):
+        self.traj.append(_point(0, speed=7.0))
+        np.testing.assert_array_equal(self.traj['speed'], [7.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from yacs.config import CfgNode as CN
+
+from track.trackloader import DataChunk
+from track.traj import Trajectory
+
+
+def _header_from_file(self, file_path):
+    """Stands in for the LLM: every column maps to its own index."""
+    names = self.get_header_list(file_path)
+    header = CN()
+    header.update({name: i for i, name in enumerate(names)})
+    return header
+
+
+class TrajRoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.cfgpath = str(self.tmp / 'data.yaml')
+        Path(self.cfgpath).write_text('model: gemini-test\n',
+                                      encoding='utf-8')
+        patches = [
+            mock.patch('track.trackloader.genai.Client'),
+            mock.patch.object(DataChunk, 'get_header_as_json',
+                              _header_from_file),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _trajectory(self):
+        traj = Trajectory()
+        traj.arr = {
+            'latitude': np.array([30.0, 30.1, 30.2]),
+            'longitude': np.array([120.0, 120.1, 120.2]),
+            'timestamp': np.array(['2024-01-01T00:00:00',
+                                   '2024-01-01T00:10:00',
+                                   '2024-01-01T00:20:00'],
+                                  dtype='datetime64[s]'),
+            'speed': np.array([10.0, 11.0, 12.0]),
+        }
+        return traj
+
+    def test_parquet_without_env_data(self):
+        traj = self._trajectory()
+        traj.traj2info(str(self.tmp / 'route.parquet'), cfgpath=self.cfgpath)
+
+        path = self.tmp / 'route.parquet'
+        self.assertEqual(pq.read_schema(path).names,
+                         ['latitude', 'longitude', 'timestamp', 'speed'])
+        chunk = traj.data_info
+        self.assertEqual(chunk.cfg.length, 3)
+        self.assertEqual(chunk.cfg.ranges.speed.max, 12.0)
+
+        loaded = Trajectory(Datachunk=chunk)
+        for key in ('latitude', 'longitude', 'timestamp', 'speed'):
+            np.testing.assert_array_equal(loaded[key], traj[key])
+
+    def test_get_range_skips_null_columns(self):
+        path = self.tmp / 'nulls.parquet'
+        pd.DataFrame({
+            'latitude': [30.0, 30.1],
+            'longitude': [120.0, 120.1],
+            'timestamp': pd.to_datetime(['2024-01-01', '2024-01-02']),
+            'w10': [None, None],
+        }).to_parquet(path, index=False)
+
+        chunk = DataChunk(path, cfg=self.cfgpath, force_regeneration=True)
+        self.assertEqual(chunk.cfg.length, 2)
+        self.assertNotIn('w10', chunk.cfg.ranges)
+        self.assertEqual(chunk.cfg.ranges.latitude.max, 30.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
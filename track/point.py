@@ -1,10 +1,188 @@
+import math
+import threading
 import numpy as np
 import xarray as xr
-from utils.geo import displacement_to_latlon
+from utils.geo import displacement_to_latlon, displacement_to_latlon_vec
 import warnings
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+from scipy.interpolate import RegularGridInterpolator
+
+
+# Open environment datasets by (path, engine), least recently used first
+_env_cache: OrderedDict[tuple, xr.Dataset] = OrderedDict()
+_env_lock = threading.Lock()
+ENV_CACHE_SIZE = 8
+
+
+def load_env(datapath: str, engine: str = 'netcdf4') -> xr.Dataset:
+    """
+    Open an environment dataset once and share it between callers.
+    At most ENV_CACHE_SIZE datasets stay open; evicted ones are closed to
+    release their file handles. xarray reopens a closed file on the next
+    lazy read, so holders of an evicted Dataset keep working.
+    """
+    key = (datapath, engine)
+    with _env_lock:
+        ds = _env_cache.get(key)
+        if ds is not None:
+            _env_cache.move_to_end(key)
+            return ds
+    ds = xr.open_dataset(datapath, engine=engine, decode_timedelta=True)
+    with _env_lock:
+        # Another thread may have opened the same file meanwhile
+        if key in _env_cache:
+            ds.close()
+            _env_cache.move_to_end(key)
+            return _env_cache[key]
+        _env_cache[key] = ds
+        if len(_env_cache) > ENV_CACHE_SIZE:
+            _, evicted = _env_cache.popitem(last=False)
+            evicted.close()
+    return ds
+
+
+def _window(axis: np.ndarray, lo: float, hi: float) -> slice:
+    """
+    Index slice of a monotonic axis covering [lo, hi] plus one neighbour on
+    each side, so linear interpolation at the edges still has both cells.
+    """
+    ascending = len(axis) < 2 or axis[0] <= axis[-1]
+    key = axis if ascending else axis[::-1]
+    start = max(np.searchsorted(key, lo, side='right') - 1, 0)
+    stop = min(np.searchsorted(key, hi, side='left') + 1, len(axis))
+    # Linear interpolation needs at least two grid points per axis
+    if stop - start < 2:
+        stop = min(start + 2, len(axis))
+        start = max(stop - 2, 0)
+    if not ascending:
+        start, stop = len(axis) - stop, len(axis) - start
+    return slice(int(start), int(stop))
+
+
+@lru_cache(maxsize=16)
+def load_interpolator(datapath: str,
+                      engine: str,
+                      keys: tuple[str, ...],
+                      bounds: tuple[float, ...] = None) -> RegularGridInterpolator:
+    """
+    Build a linear (time, latitude, longitude) interpolator for variables of
+    an environment dataset, stacked along a trailing axis in keys order, so
+    the grid search and weights are shared by all of them in one call.
+    bounds: (t_min, t_max, lat_min, lat_max, lon_min, lon_max), when given
+    only that window of the grid is read from disk.
+    Built once per dataset, key tuple and window, then reused.
+    Time is expressed as float nanoseconds since the epoch.
+    """
+    ds = load_env(datapath, engine)
+    coords = [
+        ds['time'].values.astype('datetime64[ns]').astype(np.float64),
+        ds['latitude'].values.astype(np.float64),
+        ds['longitude'].values.astype(np.float64)
+    ]
+    window = [slice(None)] * 3
+    if bounds is not None:
+        window = [
+            _window(axis, bounds[2 * dim], bounds[2 * dim + 1])
+            for dim, axis in enumerate(coords)
+        ]
+    # Lazy backends only load the selected window of each variable
+    subset = ds[list(keys)].isel(time=window[0],
+                                 latitude=window[1],
+                                 longitude=window[2])
+    axes = [axis[w] for axis, w in zip(coords, window)]
+    values = np.stack([
+        subset[key].transpose('time', 'latitude', 'longitude').values
+        for key in keys
+    ],
+                      axis=-1)
+    # ERA5-style grids store latitude descending; flip to ascending axes
+    for dim, axis in enumerate(axes):
+        if len(axis) > 1 and axis[0] > axis[-1]:
+            axes[dim] = axis[::-1]
+            values = np.flip(values, axis=dim)
+    return RegularGridInterpolator(tuple(axes),
+                                   values,
+                                   bounds_error=False,
+                                   fill_value=np.nan)
+
+
+# Per-dataset caches of interpolated points, keyed by id(Dataset). A
+# weakref.finalize drops the entry when its Dataset is collected, so no
+# Dataset is kept alive here and a reused id never finds stale values.
+_point_caches: dict[int, OrderedDict] = {}
+POINT_CACHE_SIZE = 4096
+
+
+def _point_cache(env: xr.Dataset) -> OrderedDict:
+    cache = _point_caches.get(id(env))
+    if cache is None:
+        cache = _point_caches[id(env)] = OrderedDict()
+        weakref.finalize(env, _point_caches.pop, id(env), None)
+    return cache
+
+
+def _interp_point(env: xr.Dataset, lat, lon, timestamp, keys: tuple[str, ...]):
+    """
+    Interpolate several variables of env at one (lat, lon, time) in a single
+    Dataset.interp call. Points that share envdata and position, e.g. chains
+    built with TrajPoint.follow, reuse the result.
+    """
+    cache = _point_cache(env)
+    cache_key = (lat, lon, timestamp, keys)
+    result = cache.get(cache_key)
+    if result is not None:
+        cache.move_to_end(cache_key)
+        return result
+    values = env[list(keys)].interp(latitude=lat,
+                                    longitude=lon,
+                                    time=timestamp)
+    # Plain floats: later reads are attribute lookups, no xarray dispatch
+    result = tuple(float(values[key]) for key in keys)
+    cache[cache_key] = result
+    if len(cache) > POINT_CACHE_SIZE:
+        cache.popitem(last=False)
+    return result
+
+
+def _interp_batch(env: xr.Dataset, lats, lons, timestamps,
+                  keys: tuple[str, ...]) -> np.ndarray:
+    """
+    Vectorized form of _interp_point: several variables of env at N
+    (lat, lon, time) points in one Dataset.interp call, as an (N, len(keys))
+    float array.
+    """
+    values = env[list(keys)].interp(
+        latitude=xr.DataArray(lats, dims='points'),
+        longitude=xr.DataArray(lons, dims='points'),
+        time=xr.DataArray(timestamps, dims='points'))
+    return np.column_stack([values[key].values.astype(float) for key in keys])
+
+
+def _wind_keys(env: xr.Dataset) -> tuple[str, ...]:
+    """Wind components to import from env: u10/v10, plus u100/v100 if present."""
+    if 'u100' in env and 'v100' in env:
+        return ('u10', 'v10', 'u100', 'v100')
+    return ('u10', 'v10')
+
+
+# Messages already emitted by _warn_once, so per-point methods warn only once
+_warned = set()
+
+
+def _warn_once(message: str, category=UserWarning):
+    if message in _warned:
+        return
+    _warned.add(message)
+    warnings.warn(message, category, stacklevel=3)
 
 
 class TrajPoint:
+    # No per-instance __dict__; states outside these names live in self.data
+    __slots__ = ('location', 'latitude', 'longitude', 'timestamp', 'parent',
+                 'envdata', 'data', 'wind_u', 'wind_v', 'u10', 'v10', 'u100',
+                 'v100')
 
     def __init__(self,
                  location: dict,
@@ -21,10 +199,12 @@ class TrajPoint:
         self.envdata = None
         self.data = {}
         self.wind_u, self.wind_v = None, None
+        # 未导入环境数据前为None, 由importEnv填充
+        self.u10, self.v10, self.u100, self.v100 = None, None, None, None
         self.data['latitude'] = self.latitude
         self.data['longitude'] = self.longitude
         self.data['timestamp'] = self.timestamp
-        for key, value in data.items():
+        for key, value in (data or {}).items():
             self.data[key] = value
 
     @classmethod
@@ -45,23 +225,81 @@ class TrajPoint:
         }, new_timestamp)
         new_node.parent = parent
         new_node.envdata = parent.envdata
-        new_node.setwind()
+        if new_node.envdata is not None:
+            new_node.importEnv()
         return new_node
 
-    def parent(self, parent: 'TrajPoint'):
-        self.parent = parent
+    @classmethod
+    def follow_batch(cls, parents: list['TrajPoint'], disp_xy, dt):
+        '''
+        follow 的批量版本, 位移和时间一次向量化计算
+        parents: list[TrajPoint], 上级节点
+        disp_xy: (N, 2) 位移 [dx, dy], m; 或所有节点共用的一个 [dx, dy]
+        dt: 时间间隔, s; 标量或长度为N的数组
+        '''
+        n = len(parents)
+        disp_xy = np.asarray(disp_xy, dtype=np.float64)
+        lats = np.fromiter((p.latitude for p in parents),
+                           dtype=np.float64,
+                           count=n)
+        lons = np.fromiter((p.longitude for p in parents),
+                           dtype=np.float64,
+                           count=n)
+        # 保留父节点的时间精度, 不截断到秒
+        timestamps = np.array([np.datetime64(p.timestamp) for p in parents])
+        new_lats, new_lons = displacement_to_latlon_vec(
+            lats, lons, disp_xy[..., 0], disp_xy[..., 1])
+        # 毫秒精度的时间步长, 0.5 s 之类的小数步长不会被截断为0
+        new_timestamps = timestamps + np.round(
+            np.asarray(dt, dtype=float) * 1e3).astype('timedelta64[ms]')
+        new_nodes = []
+        for parent, lat, lon, timestamp in zip(parents, new_lats.tolist(),
+                                               new_lons.tolist(),
+                                               new_timestamps):
+            new_node = TrajPoint({
+                'latitude': lat,
+                'longitude': lon
+            }, timestamp)
+            new_node.parent = parent
+            new_node.envdata = parent.envdata
+            new_nodes.append(new_node)
+        # 与 follow 一致导入环境数据; 共用同一数据集的节点一次插值
+        groups = {}
+        for i, node in enumerate(new_nodes):
+            if node.envdata is not None:
+                groups.setdefault(id(node.envdata), []).append(i)
+        for index in groups.values():
+            env = new_nodes[index[0]].envdata
+            if 'u10' not in env or 'v10' not in env:
+                print('No wind data @ 10m, run TrajPoint.setwind() first')
+                continue
+            keys = _wind_keys(env)
+            values = _interp_batch(env, new_lats[index], new_lons[index],
+                                   new_timestamps[index], keys)
+            for i, row in zip(index, values.tolist()):
+                new_nodes[i]._set_env(**dict(zip(keys, row)))
+        return new_nodes
 
     def __str__(self):
         return f"TrajPoint: {self.location}, {self.timestamp}"
 
     def update(self, **states):
         for key, value in states.items():
-            setattr(self, key, value)
+            if key in TrajPoint.__slots__:
+                setattr(self, key, value)
+            else:
+                self.data[key] = value
 
-    def set_env_data(self, datapath: str, engine='netcdf4'):
-        self.envdata = xr.open_dataset(datapath,
-                                       engine=engine,
-                                       decode_timedelta=True)
+    def set_env_data(self, datapath: str | xr.Dataset, engine='netcdf4'):
+        """
+        datapath: path to the environment file, or an already opened Dataset
+        to share between points. Paths go through load_env, so every point
+        using the same file holds the same Dataset object.
+        """
+        if isinstance(datapath, xr.Dataset):
+            self.envdata = datapath
+        else:
+            self.envdata = load_env(datapath, engine)
         self.importEnv()
 
     def setdata(self, key, value):
@@ -75,16 +313,16 @@ class TrajPoint:
         Set wind data at 10m height.
         """
 
-        self.data['w10'] = np.sqrt(u10**2 + v10**2)
-        self.data['w10_angle'] = np.arctan2(v10, u10) * 180 / np.pi
+        self.setdata('w10', np.hypot(u10, v10))
+        self.setdata('w10_angle', np.degrees(np.arctan2(v10, u10)))
 
     def setwind100(self, u100, v100):
         """
         Set wind data at 100m height.
         """
 
-        self.data['w100'] = np.sqrt(u100**2 + v100**2)
-        self.data['w100_angle'] = np.arctan2(v100, u100) * 180 / np.pi
+        self.setdata('w100', np.hypot(u100, v100))
+        self.setdata('w100_angle', np.degrees(np.arctan2(v100, u100)))
 
     def importEnv(self):
 
@@ -96,35 +334,32 @@ class TrajPoint:
             print('No wind data @ 10m, run TrajPoint.setwind() first')
             return
 
-        else:
-            self.u10 = self.envdata['u10'].interp(latitude=self.latitude,
-                                                  longitude=self.longitude,
-                                                  time=self.timestamp).values
-            self.v10 = self.envdata['v10'].interp(latitude=self.latitude,
-                                                  longitude=self.longitude,
-                                                  time=self.timestamp).values
-            self.data['u10'] = self.u10
-            self.data['v10'] = self.v10
-            self.data['w10'] = np.sqrt(self.u10**2 + self.v10**2)
-            self.data['w10_angle'] = np.arctan2(self.v10,
-                                                self.u10) * 180 / np.pi
-        if 'u100' in self.envdata and 'v100' in self.envdata:
-            self.u100 = self.envdata['u100'].interp(latitude=self.latitude,
-                                                    longitude=self.longitude,
-                                                    time=self.timestamp).values
-            self.v100 = self.envdata['v100'].interp(latitude=self.latitude,
-                                                    longitude=self.longitude,
-                                                    time=self.timestamp).values
-            self.data['u100'] = self.u100
-            self.data['v100'] = self.v100
-            self.data['w100'] = np.sqrt(self.u100**2 + self.v100**2)
-            self.data['w100_angle'] = np.arctan2(self.v100,
-                                                 self.u100) * 180 / np.pi
+        keys = _wind_keys(self.envdata)
+        self._set_env(**dict(
+            zip(
+                keys,
+                _interp_point(self.envdata, self.latitude, self.longitude,
+                              self.timestamp, keys))))
+
+    def _set_env(self, u10, v10, u100=None, v100=None):
+        """
+        Store interpolated wind components in the slots and in data, and
+        derive the wind speed/angle at each height present.
+        """
+        self.u10, self.v10 = u10, v10
+        self.data['u10'] = u10
+        self.data['v10'] = v10
+        self.setwind10(u10, v10)
+        if u100 is not None and v100 is not None:
+            self.u100, self.v100 = u100, v100
+            self.data['u100'] = u100
+            self.data['v100'] = v100
+            self.setwind100(u100, v100)
 
     def useEnv(self, warning=True):
 
         if warning:
-            warnings.warn(
+            _warn_once(
                 'This will force self.wind_u=self.u10, self.wind_v=self.v10',
                 UserWarning)
         if self.envdata is None:
@@ -137,13 +372,15 @@ class TrajPoint:
         """
         Returns the wind speed and direction at the TrajPoint's location.
         """
-        warnings.warn('Deprecated, directly use self.wind_u and self.wind_v',
-                      DeprecationWarning)
+        _warn_once(
+            'Deprecated, directly use self.wind_u and self.wind_v, '
+            'or Trajectory.compute_wind() for whole trajectories',
+            DeprecationWarning)
         if self.wind_u is None or self.wind_v is None:
             print('No wind, run TrajPoint.setwind() first')
             return
         else:
-            return np.sqrt(self.wind_u**2 + self.wind_v**2)
+            return np.hypot(self.wind_u, self.wind_v)
 
     def sail_params(self, u, v):
         '''
@@ -159,17 +396,132 @@ class TrajPoint:
                                                (self.wind_u, self.wind_v))
 
     def _calculate_sail_params(self, a, b):
-        # 计算向量c: c = -(a + b)
-        c = -(np.array(a) + np.array(b))
+        return _sail_params_kernel(a[0], a[1], b[0], b[1])
+
 
-        # 计算a和c之间的余弦值
-        cos_theta = np.dot(a, c) / (np.linalg.norm(a) * np.linalg.norm(c))
+def _sail_params_kernel(ax, ay, bx, by):
+    """
+    Scalar sail parameter math on plain floats, free of NumPy dispatch.
+    a: (ax, ay), 船速; b: (bx, by), 风速
+    return: (phi_omega(rad), V_wap(m/s))
+    """
+    # 计算向量c: c = -(a + b)
+    cx = -(ax + bx)
+    cy = -(ay + by)
 
-        # 计算phi_omega: phi_omega = pi - cos_theta
-        # 注意acos返回的是弧度值
-        phi_omega = np.pi - cos_theta
+    # phi_omega: a到c的夹角, 归一化到[-pi, pi)
+    phi_omega = math.atan2(cy, cx) - math.atan2(ay, ax)
+    phi_omega = (phi_omega + math.pi) % (2 * math.pi) - math.pi
 
-        return c, phi_omega
+    return phi_omega, math.hypot(cx, cy)
+
+
+def sail_params_vec(ax, ay, bx, by):
+    """
+    Vectorized variant of _sail_params_kernel over 1-D arrays.
+    return: (phi_omega, V_wap), each an np.ndarray
+    """
+    ax, ay = np.asarray(ax, dtype=np.float64), np.asarray(ay, dtype=np.float64)
+    cx = -(ax + bx)
+    cy = -(ay + by)
+    phi_omega = np.arctan2(cy, cx) - np.arctan2(ay, ax)
+    phi_omega = np.mod(phi_omega + np.pi, 2 * np.pi) - np.pi
+    return phi_omega, np.hypot(cx, cy)
+
+
+class TrajPointView:
+    """
+    A lightweight row view into the columnar storage of a Trajectory.
+    Attributes are read straight from the parent's arrays at index i,
+    so no per-point data is copied. TrajPoint methods are available on the
+    view, writes go through to the parent's columns, and TrajPoint.follow
+    accepts a view as parent.
+    """
+    __slots__ = ('_parent', '_i')
+
+    # Read-only TrajPoint methods work unchanged on a view
+    sail_params = TrajPoint.sail_params
+    _calculate_sail_params = TrajPoint._calculate_sail_params
+    wind = TrajPoint.wind
+    # These write through setdata, i.e. into the parent's columns
+    setwind10 = TrajPoint.setwind10
+    setwind100 = TrajPoint.setwind100
+
+    def __init__(self, parent, index: int):
+        self._parent = parent
+        self._i = index
+
+    @property
+    def location(self):
+        return {'latitude': self.latitude, 'longitude': self.longitude}
+
+    @property
+    def envdata(self):
+        """
+        The environment Dataset of the parent trajectory, set by
+        Trajectory.importEnv; None before any import.
+        """
+        return self._parent.env_dataset
+
+    @property
+    def parent(self):
+        return None
+
+    @property
+    def data(self):
+        """
+        Returns a dict snapshot of all columns at this row.
+        """
+        data = {key: col[self._i] for key, col in self._parent.arr.items()}
+        for key, col in self._parent.envdata.items():
+            data[key] = col[self._i]
+        return data
+
+    def setdata(self, key, value):
+        """
+        Set data for a specific key, writing through to the parent column.
+        A key without a column gets a new NaN-filled float column.
+        """
+        for columns in (self._parent.arr, self._parent.envdata):
+            if key in columns:
+                columns[key][self._i] = value
+                return
+        column = np.full(len(self._parent), np.nan)
+        column[self._i] = value
+        self._parent.arr[key] = column
+
+    def update(self, **states):
+        for key, value in states.items():
+            self.setdata(key, value)
+
+    def useEnv(self, warning=True):
+        """
+        Row form of TrajPoint.useEnv, wind_u/wind_v take the u10/v10 values.
+        """
+        if warning:
+            _warn_once(
+                'This will force self.wind_u=self.u10, self.wind_v=self.v10',
+                UserWarning)
+        if self.u10 is None or self.v10 is None:
+            print('No wind data @ 10m, run Trajectory.setwinddata() first')
+            return
+        self.setdata('wind_u', self.u10)
+        self.setdata('wind_v', self.v10)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        for columns in (self._parent.arr, self._parent.envdata):
+            if name in columns:
+                return columns[name][self._i]
+        # TrajPoint states without a column read as unset, like on a TrajPoint
+        if name in TrajPoint.__slots__:
+            return None
+        raise AttributeError(
+            f"'{type(self).__name__}' has no attribute '{name}'")
+
+    def __str__(self):
+        return f"TrajPoint: {self.location}, {self.timestamp}"
 
 
 if __name__ == '__main__':
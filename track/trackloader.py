@@ -7,6 +7,9 @@ from pathlib import Path
 import os
 import yaml
 import shutil
+import hashlib
+from importlib.util import find_spec
+from concurrent.futures import ThreadPoolExecutor
 # Sheet header indentifier using LLM
 from google import genai
 from google.genai import types
@@ -14,6 +17,12 @@ from track.point import TrajPoint
 from utils.cfg import build_cfg
 from utils.llmengine import LLMEngine
 
+# Cache of LLM header-inference responses, keyed by header/prompt/model hash
+LLM_CACHE_DIR = Path.home() / '.cache' / 'shiptrack' / 'llm'
+# get_range streams CSVs larger than this, RANGE_CHUNKSIZE rows at a time
+RANGE_STREAM_BYTES = 256 * 1024 * 1024
+RANGE_CHUNKSIZE = 1_000_000
+
 
 class DataChunk:
     """
@@ -46,6 +55,8 @@ class DataChunk:
         self.filetype = None
         self.cfg.length = None
         self.datarange = datarange
+        # Parsed columns from get_data, per key
+        self._data_cache = {}
         '''Initialization'''
         # cache directory
 
@@ -162,15 +173,56 @@ class DataChunk:
                     encoding: str = 'utf-8',
                     **kwargs) -> pd.DataFrame:
         """Returns the appropriate pandas function to read a file based on its suffix."""
+        fast_engine = self.cfg.get('fast_engine', False)
         if suffix == 'csv':
             self.filetype = 'csv'
+            # pyarrow engine cannot do row windows or chunks, keep C engine there
+            if fast_engine and kwargs.get('nrows') is None and kwargs.get(
+                    'skiprows') is None and kwargs.get('chunksize') is None:
+                kwargs.pop('nrows', None)
+                kwargs.pop('skiprows', None)
+                usecols = kwargs.get('usecols')
+                if usecols is not None:
+                    # pyarrow only takes column names, in file order like C engine
+                    names = pd.read_csv(file_path, encoding=encoding,
+                                        nrows=0).columns
+                    kwargs['usecols'] = [names[i] for i in sorted(usecols)]
+                return pd.read_csv(file_path,
+                                   encoding=encoding,
+                                   engine='pyarrow',
+                                   **kwargs)
             return pd.read_csv(file_path, encoding=encoding, **kwargs)
         elif suffix == 'xlsx':
             self.filetype = 'xlsx'
+            if fast_engine and find_spec('python_calamine') is not None:
+                return pd.read_excel(file_path, engine='calamine', **kwargs)
             return pd.read_excel(file_path, **kwargs)
+        elif suffix == 'parquet':
+            self.filetype = 'parquet'
+            return self._read_parquet(file_path, **kwargs)
         else:
             raise ValueError(f"Unsupported file type: {suffix}")
 
+    @staticmethod
+    def _read_parquet(file_path: str,
+                      usecols: list = None,
+                      skiprows=None,
+                      nrows: int = None) -> pd.DataFrame:
+        """
+        Reads a parquet file with the read_csv style arguments used here.
+        Only the requested columns are read; skiprows is a range of data
+        rows after the header, as passed by the CSV callers.
+        """
+        import pyarrow.parquet as pq
+        names = pq.read_schema(file_path).names
+        if nrows == 0:
+            return pd.DataFrame(columns=names)
+        columns = [names[i] for i in sorted(usecols)] if usecols else None
+        df = pd.read_parquet(file_path, columns=columns)
+        start = len(skiprows) if skiprows is not None else 0
+        stop = start + nrows if nrows is not None else None
+        return df.iloc[start:stop].reset_index(drop=True)
+
     def get_header_list(self, file_path: str) -> list:
         """Reads only the header of a data file and returns it as a list."""
         suffix = self._get_suffix(file_path)
@@ -188,14 +240,131 @@ class DataChunk:
         header_str = str(header_list)
         prompt_template = self.read_txt(self.cfg.header_getter)
         context = f"{header_str}<<{prompt_template}>>"
-        llmengine = LLMEngine(model_name=self.model,
-                              yaml_path=self.cfg.yamlpath)
-        response = llmengine(context)
+        # The same header + prompt + model always yields the same mapping,
+        # so reuse a previous LLM answer instead of another round-trip.
+        cache_file = self._llm_cache_file(self.model, context)
+        if cache_file.exists():
+            response = cache_file.read_text(encoding='utf-8')
+        else:
+            llmengine = LLMEngine(model_name=self.model,
+                                  yaml_path=self.cfg.yamlpath)
+            response = llmengine(context, json_mode=True)
         header = CN()
-        header.update(dict(json.loads(response)))
+        header.update(self._parse_header(response))
+        if not cache_file.exists():
+            self._write_atomic(cache_file, response)
 
         return header
 
+    @staticmethod
+    def _parse_header(response: str) -> dict:
+        """
+        Parses an LLM header answer, a JSON object mapping names to columns.
+        Raises ValueError for anything else, so malformed answers never reach
+        the cache.
+        """
+        header = json.loads(response)
+        if not isinstance(header, dict):
+            raise ValueError(f"Malformed header answer: {response[:200]}")
+        return header
+
+    @staticmethod
+    def _llm_cache_file(model: str, context: str) -> Path:
+        """Returns the on-disk cache file for an LLM header response."""
+        key = hashlib.sha256((model + context).encode('utf-8')).hexdigest()
+        return LLM_CACHE_DIR / f"{key}.json"
+
+    @staticmethod
+    def _write_atomic(path: Path, content: str):
+        """Writes content to path via a temporary file and os.replace."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(content, encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def batch_headers(cls,
+                      paths: list[str],
+                      cfg: str,
+                      encode: str = 'utf-8',
+                      max_concurrency: int = 4) -> list[CN]:
+        """
+        Infers the structured headers of several files with one LLM request.
+
+        Headers are joined with a <<ROW>> delimiter and the model is asked for
+        a JSON list with one object per file. Each answer is written to the
+        header cache, so DataChunk(path, ...) afterwards skips the LLM call.
+        If the batched answer cannot be used, files are sent one per request
+        with at most max_concurrency requests in flight.
+        """
+        cfg = build_cfg(cfg)
+        prompt_template = cls.read_txt(cfg.header_getter)
+        headers, contexts = [], []
+        for path in paths:
+            suffix = cls._get_suffix(str(path))
+            if suffix == 'csv':
+                df = pd.read_csv(path, encoding=encode, nrows=0)
+            elif suffix == 'xlsx':
+                df = pd.read_excel(path, nrows=0)
+            elif suffix == 'parquet':
+                df = cls._read_parquet(path, nrows=0)
+            else:
+                raise ValueError(f"Unsupported file type: {suffix}")
+            headers.append(str(df.columns.tolist()))
+            contexts.append(f"{headers[-1]}<<{prompt_template}>>")
+
+        pending = [
+            i for i, context in enumerate(contexts)
+            if not cls._llm_cache_file(cfg.model, context).exists()
+        ]
+        llmengine = LLMEngine(model_name=cfg.model, yaml_path=cfg.yamlpath)
+        if len(pending) > 1:
+            batch_prompt = "\n<<ROW>>\n".join(headers[i] for i in pending)
+            # JSON mode only guarantees an object at the top level, so the
+            # list of per-file answers is wrapped in {"headers": [...]}
+            batch_prompt += (
+                f"<<{prompt_template}>>"
+                f"<<Each <<ROW>> above is a separate file header. Answer with a "
+                f"JSON object {{\"headers\": [...]}} whose list holds "
+                f"{len(pending)} objects, one per row, in order.>>")
+            try:
+                answers = json.loads(llmengine(batch_prompt, json_mode=True))
+                if isinstance(answers, dict):
+                    answers = answers.get('headers')
+                if not isinstance(answers, list) or len(answers) != len(
+                        pending):
+                    raise ValueError("Batched header answer has wrong shape")
+                answers = [
+                    cls._parse_header(json.dumps(answer)) for answer in answers
+                ]
+                for i, answer in zip(pending, answers):
+                    cls._write_atomic(
+                        cls._llm_cache_file(cfg.model, contexts[i]),
+                        json.dumps(answer))
+                pending = []
+            except ValueError as e:
+                print(f"Batched header inference failed ({e}), "
+                      f"falling back to one request per file.")
+
+        def infer(i):
+            response = llmengine(contexts[i], json_mode=True)
+            cls._parse_header(response)  # only cache well-formed answers
+            cls._write_atomic(cls._llm_cache_file(cfg.model, contexts[i]),
+                              response)
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            list(executor.map(infer, pending))
+
+        header_jsons = []
+        for context in contexts:
+            header = CN()
+            header.update(
+                cls._parse_header(
+                    cls._llm_cache_file(cfg.model,
+                                        context).read_text(encoding='utf-8')))
+            header_jsons.append(header)
+        return header_jsons
+
     def get_delta_time(self, header_json: CN) -> float:
         """
         Calculates the time difference in seconds from data within the header JSON.
@@ -203,6 +372,7 @@ class DataChunk:
         """
 
         timestamp_index = header_json.timestamp
+        # Only the first two rows are needed; the row count comes from get_range
         df_time_column = self.load_method(
             self.path,
             suffix=self.filetype,
@@ -210,14 +380,13 @@ class DataChunk:
             usecols=[timestamp_index],
             skiprows=range(1, self.datarange[0] +
                            1) if self.datarange else None,
-            nrows=self.datarange[1] -
-            self.datarange[0] if self.datarange else None)
+            nrows=min(2, self.datarange[1] -
+                      self.datarange[0]) if self.datarange else 2)
         if df_time_column.empty:
             raise ValueError("Timestamp column is empty")
         # Convert the timestamp column to datetime
         df_time_column = pd.to_datetime(df_time_column.iloc[:, 0],
                                         errors='coerce')
-        self.cfg.length = df_time_column.shape[0]
         if df_time_column.isnull().all():
             raise ValueError("All timestamps are invalid or missing")
         # Calculate the time difference in seconds
@@ -227,20 +396,67 @@ class DataChunk:
         return time_diff.total_seconds() if time_diff else None
 
     def get_data(self, key: str) -> np.ndarray:
+        """
+        Returns one column as an array. Parsed columns are kept in memory,
+        so repeated requests skip the file read; callers get their own copy.
+        """
+        if key not in self._data_cache:
+            self._data_cache[key] = self._read_column(key)
+        return self._data_cache[key].copy()
+
+    def get_all(self, keys: list[str] = None) -> dict[str, np.ndarray]:
+        """
+        Returns several columns at once, by default every column the header
+        maps to an index. Columns not cached yet are read in one file pass.
+        """
+        if keys is None:
+            keys = [
+                key for key in self.cfg.header
+                if isinstance(self.cfg.header[key], int)
+            ]
+        missing = [key for key in keys if key not in self._data_cache]
+        if missing:
+            indices = sorted({self.cfg.header[key] for key in missing})
+            df = self._load_columns(indices)
+            if df.empty:
+                raise ValueError(f"Column {missing[0]} is empty")
+            position = {index: i for i, index in enumerate(indices)}
+            for key in missing:
+                self._data_cache[key] = self._finish_column(
+                    key, df.iloc[:, position[self.cfg.header[key]]])
+        return {key: self._data_cache[key].copy() for key in keys}
+
+    def _read_column(self, key: str) -> np.ndarray:
         index = self.cfg.header[key]
         if index is None:
             raise ValueError(f"Key '{key}' not found in header")
-        df = self.load_method(self.path,
-                              suffix=self.filetype,
-                              encoding=self.encode,
-                              usecols=[index],
-                              skiprows=range(1, self.datarange[0] +
-                                             1) if self.datarange else None,
-                              nrows=self.datarange[1] -
-                              self.datarange[0] if self.datarange else None)
+        df = self._load_columns([index])
         if df.empty:
             raise ValueError(f"Column {key} is empty")
-        data = df.iloc[:, 0].to_numpy()
+        return self._finish_column(key, df.iloc[:, 0])
+
+    def _load_columns(self, indices: list[int]) -> pd.DataFrame:
+        """Reads the given column indices within the chunk's data range."""
+        return self.load_method(self.path,
+                                suffix=self.filetype,
+                                encoding=self.encode,
+                                usecols=indices,
+                                skiprows=range(1, self.datarange[0] +
+                                               1) if self.datarange else None,
+                                nrows=self.datarange[1] -
+                                self.datarange[0] if self.datarange else None)
+
+    def _finish_column(self, key: str, col: pd.Series) -> np.ndarray:
+        """Turns a raw column into its array: timestamps parsed, clip applied."""
+        if key == 'timestamp':
+            # Parse here once so every consumer gets datetime64 directly;
+            # an explicit cfg.timestamp_format skips per-file format inference
+            data = pd.to_datetime(col,
+                                  format=self.cfg.get('timestamp_format'),
+                                  errors='coerce',
+                                  cache=True).to_numpy()
+        else:
+            data = col.to_numpy()
         if key in self.clip:
             data = self.clip[key](data=data)
         return data
@@ -248,53 +464,92 @@ class DataChunk:
     def get_range(self, header_json: CN) -> CN:
         """
         Extracts the range of values for each column specified in the header JSON.
+        Large CSVs are streamed in chunks and reduced per chunk, so memory stays
+        bounded by RANGE_CHUNKSIZE rows; the row count is taken in the same pass.
         """
         range_CN = CN()
-        for key in header_json.keys():
-            index = header_json[key]
-            if index is None:
+        # Read every labelled column in one pass instead of one parse per key;
+        # pandas returns usecols in file order, so map indices to positions
+        indices = sorted({
+            header_json[key]
+            for key in header_json.keys() if header_json[key] is not None
+        })
+        if not indices:
+            return range_CN
+        stream = (self.filetype == 'csv'
+                  and os.path.getsize(self.path) > RANGE_STREAM_BYTES)
+        frames = self.load_method(
+            self.path,
+            suffix=self.filetype,
+            encoding=self.encode,
+            usecols=indices,
+            skiprows=range(1, self.datarange[0] +
+                           1) if self.datarange else None,
+            nrows=self.datarange[1] -
+            self.datarange[0] if self.datarange else None,
+            **({
+                'chunksize': RANGE_CHUNKSIZE
+            } if stream else {}))
+        if isinstance(frames, pd.DataFrame):
+            frames = [frames]
+        position = {index: i for i, index in enumerate(indices)}
+        keys = [
+            key for key in header_json.keys() if header_json[key] is not None
+        ]
+        # Per-chunk partial extrema, reduced once all chunks are seen
+        partials = {key: [] for key in keys}
+        length = 0
+        for frame in frames:
+            length += len(frame)
+            for key in keys:
+                col = frame.iloc[:, position[header_json[key]]]
+                if key == 'timestamp':
+                    col = pd.to_datetime(col, errors='coerce')
+                    partials[key].append((col.min(), col.max()))
+                elif key == 'longitude':
+                    col = pd.to_numeric(col, errors='coerce')
+                    neg, pos = col[col < 0], col[col >= 0]
+                    partials[key].append(
+                        (neg.max(), neg.min(), pos.min(), pos.max()))
+                else:
+                    # Null-typed or text columns have no numeric range
+                    if not pd.api.types.is_numeric_dtype(col):
+                        continue
+                    data = col.to_numpy()
+                    if key in self.clip:
+                        data = self.clip[key](data=data)
+                    partials[key].append((np.nanmin(data), np.nanmax(data)))
+        if length == 0:
+            raise ValueError(f"Column {keys[0]} is empty")
+        self.cfg.length = length
+
+        for key in keys:
+            if not partials[key]:
                 continue
-
-            df = self.load_method(
-                self.path,
-                suffix=self.filetype,
-                encoding=self.encode,
-                usecols=[index],
-                skiprows=range(1, self.datarange[0] +
-                               1) if self.datarange else None,
-                nrows=self.datarange[1] -
-                self.datarange[0] if self.datarange else None)
-            if df.empty:
-                raise ValueError(f"Column {key} is empty")
+            parts = pd.DataFrame(partials[key])
             if key == 'timestamp':
-                df = pd.to_datetime(df.iloc[:, 0], errors='coerce')
                 range_CN[key] = CN()
-                range_CN[key].min = str(df.min().to_pydatetime())
-                range_CN[key].max = str(df.max().to_pydatetime())
+                range_CN[key].min = str(
+                    pd.Timestamp(parts[0].min()).to_pydatetime())
+                range_CN[key].max = str(
+                    pd.Timestamp(parts[1].max()).to_pydatetime())
                 continue
             if key == 'longitude':
                 # Devide into [-num, 0] and [0, num], it's hard to get data in [+num, -num] in CDS website,
                 # the default range order is from -180 to 180, east to west
-                df = pd.to_numeric(df.iloc[:, 0], errors='coerce')
-
                 range_CN[key] = CN()
                 range_CN[key].neg = [
-                    float(df[df < 0].max()),
-                    float(df[df < 0].min())
+                    float(parts[0].max()),
+                    float(parts[1].min())
                 ]
                 range_CN[key].pos = [
-                    float(df[df >= 0].min()),
-                    float(df[df >= 0].max())
+                    float(parts[2].min()),
+                    float(parts[3].max())
                 ]
                 continue
-            data = df.iloc[:, 0].to_numpy()
-            if key in self.clip:
-                data = self.clip[key](data=data)
-            min_val = np.nanmin(data)
-            max_val = np.nanmax(data)
             range_CN[key] = CN()
-            range_CN[key].min = float(min_val)
-            range_CN[key].max = float(max_val)
+            range_CN[key].min = float(parts[0].min())
+            range_CN[key].max = float(parts[1].max())
         return range_CN
 
     def extract_basic_info(self, file_path: str) -> dict:
@@ -331,10 +586,18 @@ if __name__ == "__main__":
     # Example usage
 
     data_llm_cfg_path = "./llm/data.yaml"
-    cfg = build_cfg(data_llm_cfg_path)
-    cfg.encode = 'utf-8'  # Set the encoding to GBK
     file_path = ["./data/split.csv"]
-    for path in file_path:
+    # Infer all headers with a single LLM request; DataChunk then hits the cache
+    DataChunk.batch_headers(file_path, cfg=data_llm_cfg_path, encode='utf-8')
+
+    def load(path):
         print(f"Processing file: {path}")
-        # Create an instance of DataChunk
-        chunk = DataChunk(path, cfg, force_regeneration=True)
+        # Each DataChunk builds its own cfg from the path, nothing is shared
+        return DataChunk(path,
+                         cfg=data_llm_cfg_path,
+                         force_regeneration=True,
+                         encode='utf-8')
+
+    # File reads and any remaining LLM calls overlap across files
+    with ThreadPoolExecutor(max_workers=min(32, len(file_path))) as executor:
+        chunks = list(executor.map(load, file_path))
@@ -1,16 +1,23 @@
 import numpy as np
-import xarray as xr
 import warnings
 import pandas as pd
-import webbrowser
-import json
-import os
-from tqdm.rich import tqdm
 from pathlib import Path
 from track.trackloader import DataChunk
-from track.point import TrajPoint
-from utils.geo import displacement_to_latlon
-from utils.cfg import build_cfg
+from track.point import (TrajPoint, TrajPointView, load_env,
+                         load_interpolator, sail_params_vec)
+from utils.geo import displacement_to_latlon_vec
+
+
+def normalize_timestamps(col: np.ndarray) -> np.ndarray:
+    """
+    Cast a datetime64 column to second resolution when that loses nothing,
+    so loaded timestamps share one unit. Other columns pass through as is.
+    """
+    if np.issubdtype(col.dtype, np.datetime64):
+        seconds = col.astype('datetime64[s]')
+        if (seconds == col)[~np.isnat(col)].all():
+            return seconds
+    return col
 
 
 class TrajVizContainer:
@@ -138,7 +145,14 @@ class Trajectory:
         """
         # Two init input will lead to conflict, raise an error
         self.chunks: list[DataChunk] = []
+        # Columnar (SoA) storage: one 1-D array per field, aligned by point index.
+        # TrajPoints handed out by the trajectory are views into these arrays.
+        self.arr: dict[str, np.ndarray] = {}
         self.envdata = {}
+        # Dataset behind envdata, shared with TrajPoints built by follow()
+        self.env_dataset = None
+        # Growth buffers behind append(), keyed by (store, column)
+        self._buffers: dict[tuple, np.ndarray] = {}
         # The continuous_chunk_list is used to store chunks of continuous trajectory points,
         # A chunk is a continuous trajectory coming from the same sheet source,
         # In a same chunk, DataChunk.get_point(i) can be replaced with ~.load_method().
@@ -148,171 +162,213 @@ class Trajectory:
                 raise ValueError(
                     "Cannot initialize Trajectory with both traj_points and Datachunk/sheet_path."
                 )
-            self.traj_points = traj_points
-            self.data_info = self.traj2info()
+            self.arr = self.points2arr(traj_points)
+            self.data_info = None
             self.sheet_path = None
 
         elif Datachunk is not None:
             self.data_info = Datachunk
-            self.traj_points = self.info2traj()
+            self.arr = self.info2traj()
             self.sheet_path = Datachunk.path
             self.chunks.append(Datachunk)
         else:
             warnings.warn(
                 "No traj_points or sheet_path provided, initializing empty trajectory.",
                 UserWarning)
-            self.traj_points = []
             self.data_info = None
             self.sheet_path = None
 
+    @property
+    def traj_points(self) -> tuple[TrajPointView, ...]:
+        """
+        Row views over the columnar storage, one per trajectory point.
+        Built fresh on each access, so it is a read-only tuple; add points
+        with Trajectory.append.
+        """
+        return tuple(TrajPointView(self, i) for i in range(len(self)))
+
+    @staticmethod
+    def points2arr(traj_points: list['TrajPoint']) -> dict:
+        """
+        Convert a list of TrajPoint objects into columnar arrays.
+        """
+        if not traj_points:
+            return {}
+        datas = [point.data for point in traj_points]
+        return {key: np.array([data[key] for data in datas]) for key in datas[0]}
+
     def info2traj(self):
         """
-        Optimized version to load all trajectory points from the data source in bulk.
+        Load all trajectory columns from the data source in bulk.
         """
         length = self.data_info.cfg.length
         if length == 0:
             print("No TrajPoints in the trajectory to load.")
-            return []
-
-        cfg = self.data_info.cfg
-
-        latitudes = self.data_info.get_data('latitude')
-        longitudes = self.data_info.get_data('longitude')
-        timestamps = self.data_info.get_data('timestamp')
-        timestamps = pd.to_datetime(timestamps).to_numpy()
-        primary_cols = {'latitude', 'longitude', 'timestamp'}
-        other_keys = [
-            key for key in cfg.header
-            if key not in primary_cols and isinstance(cfg.header[key], int)
-        ]
-        other_data_cols = {
-            key: self.data_info.get_data(key)
-            for key in other_keys
+            return {}
+
+        # One read for every mapped column instead of one per key
+        columns = self.data_info.get_all()
+        timestamps = columns.pop('timestamp')
+        if timestamps.dtype.kind != 'M':
+            timestamps = pd.to_datetime(timestamps).to_numpy()
+        arr = {
+            'latitude': columns.pop('latitude'),
+            'longitude': columns.pop('longitude'),
+            'timestamp': normalize_timestamps(timestamps)
         }
+        for key, col in columns.items():
+            arr[key] = normalize_timestamps(col)
 
-        data_dicts = [{
-            key: other_data_cols[key][i]
-            for key in other_keys
-        } for i in range(length)]
-
-        traj_points = [
-            TrajPoint({
-                'latitude': lat,
-                'longitude': lon
-            },
-                      timestamp=ts,
-                      data=data_dict) for lat, lon, ts, data_dict in tqdm(
-                          zip(latitudes, longitudes, timestamps, data_dicts),
-                          total=length,
-                          desc="Loading TrajPoints (Optimized)",
-                          unit="point")
-        ]
-
-        print(
-            f"Loaded {len(traj_points)} TrajPoints from the trajectory info.")
-        return traj_points
-
-    def traj2info(self, path: str, cfgpath: str = './llm/data.yaml'):
-        """
-        Save the trajectory points to a CSV file.
-        :param path: Path to save the CSV file.
-        """
-        if not self.traj_points:
+        print(f"Loaded {length} TrajPoints from the trajectory info.")
+        return arr
+
+    def traj2info(self,
+                  path: str,
+                  cfgpath: str = './llm/data.yaml',
+                  format: str = 'parquet'):
+        """
+        Save the trajectory points to a Parquet (default) or CSV file.
+        :param path: Path to save to, the suffix is replaced by the format's.
+        :param format: 'parquet', or 'csv' for interop with other tools.
+        """
+        if format not in ('parquet', 'csv'):
+            raise ValueError(
+                f"Unsupported format: {format}. Must be 'parquet' or 'csv'.")
+        if not len(self):
             print("No TrajPoints in the trajectory to save.")
             return
+        # Column names straight from the SoA storage, no row snapshot needed
+        sample_data = {**self.arr, **self.envdata}
         geodata = {
-            'latitude':
-            self['latitude'],
-            'longitude':
-            self['longitude'],
-            'timestamp':
-            self['timestamp']
-            if 'timestamp' in self.traj_points[0].data else None
+            'latitude': self.arr['latitude'],
+            'longitude': self.arr['longitude'],
+            'timestamp': self.arr.get('timestamp')
         }
+        # Environment columns are referenced as whole arrays. Missing or all-None
+        # ones are left out, Parquet would store them as null-typed columns
+        env_keys = ('wind_u', 'wind_v', 'true_wind_speed', 'true_wind_direction',
+                    'w10', 'w100', 'w10_angle', 'w100_angle', 'u10', 'v10',
+                    'u100', 'v100')
         envdata = {
-            'wind_u':
-            self['wind_u'] if 'wind_u' in self.traj_points[0].data else None,
-            'wind_v':
-            self['wind_v'] if 'wind_v' in self.traj_points[0].data else None,
-            'true_wind_speed':
-            self['true_wind_speed']
-            if 'true_wind_speed' in self.traj_points[0].data else None,
-            'true_wind_direction':
-            self['true_wind_direction']
-            if 'true_wind_direction' in self.traj_points[0].data else None,
-            'w10':
-            self['w10'] if 'w10' in self.traj_points[0].data else None,
-            'w100':
-            self['w100'] if 'w100' in self.traj_points[0].data else None,
-            'w10_angle':
-            self['w10_angle']
-            if 'w10_angle' in self.traj_points[0].data else None,
-            'w100_angle':
-            self['w100_angle']
-            if 'w100_angle' in self.traj_points[0].data else None,
-            'u10':
-            self['u10'] if 'u10' in self.traj_points[0].data else None,
-            'v10':
-            self['v10'] if 'v10' in self.traj_points[0].data else None,
-            'u100':
-            self['u100'] if 'u100' in self.traj_points[0].data else None,
-            'v100':
-            self['v100'] if 'v100' in self.traj_points[0].data else None
+            key: sample_data[key]
+            for key in env_keys
+            if not self._all_none(sample_data.get(key))
         }
-        other_data_keys = self.traj_points[0].data.keys(
-        ) if self.traj_points else []
         other_data = {
-            key: [self[key] for key in other_data_keys]
-            if key not in geodata and key not in envdata else None
-            for key in other_data_keys
+            key: col
+            for key, col in sample_data.items()
             if key not in geodata and key not in envdata
         }
         df = pd.DataFrame({**geodata, **envdata, **other_data})
-        df.to_csv(path, index=False)
+        path = Path(path).with_suffix(f'.{format}')
+        if format == 'parquet':
+            # Columnar and typed: timestamps come back without re-parsing
+            df.to_parquet(path,
+                          index=False,
+                          engine='pyarrow',
+                          compression='zstd')
+        else:
+            try:
+                import pyarrow as pa
+                import pyarrow.csv as pacsv
+            except ImportError:
+                df.to_csv(path, index=False)
+            else:
+                # Arrow's C++ writer, far faster than DataFrame.to_csv
+                pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False),
+                                path)
         print(f"Trajectory saved to {path}")
-        self.data_info = DataChunk(path,
-                                   cfg=build_cfg(cfgpath),
-                                   force_regeneration=True)
+        self.data_info = DataChunk(path, cfg=cfgpath, force_regeneration=True)
+
+    @staticmethod
+    def _all_none(col) -> bool:
+        """True for a missing column or an object column holding only None."""
+        if col is None:
+            return True
+        col = np.asarray(col)
+        return col.dtype == object and all(value is None for value in col)
 
     def append(self, point: 'TrajPoint'):
         """
         Add a TrajPoint to the trajectory.
         :param point: TrajPoint object to add.
         """
-        self.traj_points.append(point)
+        if not self.arr:
+            self.arr = self.points2arr([point])
+            return
+        data = point.data
+        n = len(self)
+        # Keys the trajectory has no column for yet get one, backfilled for
+        # the earlier rows, so no value of the point is dropped
+        for key in data:
+            if key not in self.arr and key not in self.envdata:
+                self.arr[key] = self._missing_column(n, data[key])
+        for store, columns in (('arr', self.arr), ('envdata', self.envdata)):
+            for key, col in columns.items():
+                columns[key] = self._push(
+                    (store, key), col,
+                    data[key] if key in data else self._missing_value(col))
         #TODO: Implement chunking logic
         # self.continuous_chunk_list.append([point])
         # self.chunk_datapath_list.append(point.envdata)
 
+    @staticmethod
+    def _missing_column(n: int, value) -> np.ndarray:
+        """
+        Column of n missing values able to hold value: NaN for numbers,
+        NaT for timestamps, None otherwise.
+        """
+        dtype = np.asarray(value).dtype
+        if dtype.kind in 'biuf':
+            return np.full(n, np.nan, dtype=np.result_type(dtype, np.float64))
+        if dtype.kind == 'M':
+            return np.full(n, np.datetime64('NaT'), dtype=dtype)
+        return np.full(n, None, dtype=object)
+
+    @staticmethod
+    def _missing_value(col: np.ndarray):
+        """Missing value for a row absent from the appended point."""
+        if col.dtype.kind == 'M':
+            return np.datetime64('NaT')
+        return None if col.dtype == object else np.nan
+
+    def _push(self, buffer_key: tuple, col: np.ndarray, value) -> np.ndarray:
+        """
+        Append one value to a column through a capacity-doubling buffer.
+        The column handed out is a view of the first n slots, so appends
+        are amortized O(1) instead of a full copy per np.append.
+        """
+        n = len(col)
+        buf = self._buffers.get(buffer_key)
+        dtype = np.result_type(col.dtype, np.asarray(value).dtype)
+        # Reuse the buffer only if col still is its head and there is room
+        if (buf is None or col.base is not buf
+                or col.ctypes.data != buf.ctypes.data or buf.dtype != dtype
+                or len(buf) == n):
+            buf = np.empty(max(2 * n, 1024), dtype=dtype)
+            buf[:n] = col
+            self._buffers[buffer_key] = buf
+        buf[n] = value
+        return buf[:n + 1]
+
     def setwinddata(self, datapath: str, engine='netcdf4'):
         """
         Set environment data for all TrajPoints in the trajectory.
         :param datapath: Path to the environment data file.
         :param engine: Engine to use for reading the data (default is 'netcdf4').
         """
-        self.importEnv(key='u10', envfile=datapath, engine=engine)
-        self.importEnv(key='v10', envfile=datapath, engine=engine)
-        self.importEnv(key='u100', envfile=datapath, engine=engine)
-        self.importEnv(key='v100', envfile=datapath, engine=engine)
-        self.envdata['w10'] = np.sqrt(self.envdata['u10']**2 +
-                                      self.envdata['v10']**2)
-        self.envdata['w10_angle'] = np.arctan2(
-            self.envdata['v10'], self.envdata['u10']) * 180 / np.pi
-        self.envdata['w100'] = np.sqrt(self.envdata['u100']**2 +
-                                       self.envdata['v100']**2)
-        self.envdata['w100_angle'] = np.arctan2(
-            self.envdata['v100'], self.envdata['u100']) * 180 / np.pi
-
-        indices = self.chunk2index()
-        for chunk, index in zip(self.chunks, indices):
-            tqdm.pandas(desc="Setting w10 and w100 data for TrajPoints",
-                        unit="point")
-            for i, point in tqdm(enumerate(
-                    self.traj_points[index[0]:index[1]]),
-                                 total=index[1] - index[0]):
-                point.setwind10(point.data['u10'], point.data['v10'])
-                point.setwind100(point.data['u100'], point.data['v100'])
-            print("Wind data set for all TrajPoints in the trajectory.")
+        self.importEnv(key=['u10', 'v10', 'u100', 'v100'],
+                       envfile=datapath,
+                       engine=engine)
+        # Wind speed and direction are derived over whole arrays at once
+        for height in ('10', '100'):
+            u = self.envdata[f'u{height}']
+            v = self.envdata[f'v{height}']
+            self.envdata[f'w{height}'] = np.hypot(u, v)
+            # Convert in place, no second temporary for the degrees
+            angle = np.arctan2(v, u)
+            self.envdata[f'w{height}_angle'] = np.rad2deg(angle, out=angle)
+        print("Wind data set for all TrajPoints in the trajectory.")
 
     def useEnv(self, warning=True):
         """
@@ -323,45 +379,104 @@ class Trajectory:
             warnings.warn(
                 'This method *assumes* that the GroundTruth wind data is *exactly* the same as the wind data on the ship.',
                 UserWarning)
-        if not self.traj_points:
+        if not len(self):
             print('No TrajPoints in the trajectory to use environment data.')
             return
-        for point in self.traj_points:
-            point.useEnv(warning=False)
+        if 'u10' not in self.envdata or 'v10' not in self.envdata:
+            print('No wind data @ 10m, run Trajectory.setwinddata() first')
+            return
+        # Own copies, so writes to wind_u/wind_v never alter u10/v10
+        self.arr['wind_u'] = self.envdata['u10'].copy()
+        self.arr['wind_v'] = self.envdata['v10'].copy()
+
+    def compute_wind(self):
+        """
+        Compute wind speed and direction for all points from wind_u/wind_v.
+        Run Trajectory.useEnv() first to populate the wind components.
+        """
+        if 'wind_u' not in self.arr or 'wind_v' not in self.arr:
+            print('No wind, run Trajectory.useEnv() first')
+            return
+        wind_u = self.arr['wind_u']
+        wind_v = self.arr['wind_v']
+        self.arr['wind'] = np.hypot(wind_u, wind_v)
+        wind_dir = np.arctan2(wind_v, wind_u)
+        self.arr['wind_dir'] = np.rad2deg(wind_dir, out=wind_dir)
+
+    def sail_params_all(self, u: np.ndarray,
+                        v: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Sail parameters for every point at once, the batch form of
+        TrajPoint.sail_params. Run Trajectory.useEnv() first.
+        :param u: East ship speed per point, m/s.
+        :param v: North ship speed per point, m/s.
+        :return: (phi_omega(rad), V_wap(m/s)) arrays.
+        """
+        if 'wind_u' not in self.arr or 'wind_v' not in self.arr:
+            print('No wind, run Trajectory.useEnv() first')
+            return
+        return sail_params_vec(u, v, self.arr['wind_u'], self.arr['wind_v'])
 
-    def importEnv(self, key: str, envfile: str, engine: str = 'cfgrib'):
+    def importEnv(self,
+                  key: str | list[str],
+                  envfile: str,
+                  engine: str = 'cfgrib'):
         """
         Import environment data for all TrajPoints in the trajectory.
         This method is called automatically when setting environment data.
+        All variables are evaluated for all points with one prebuilt
+        RegularGridInterpolator call.
+        :param key: Variable name, or list of variable names, to import.
         """
 
-        if not self.traj_points:
+        if not len(self):
             print(
                 "No TrajPoints in the trajectory to import environment data.")
             return
-        indices = self.chunk2index()
-        for chunk, index in zip(self.chunks, indices):
-            time_coords = chunk.get_data('timestamp')
-            lat_coords = chunk.get_data('latitude')
-            lon_coords = chunk.get_data('longitude')
-            time_coords = xr.DataArray(pd.to_datetime(time_coords).to_numpy(),
-                                       dims='points')
-            lat_coords = xr.DataArray(lat_coords, dims='points')
-            lon_coords = xr.DataArray(lon_coords, dims='points')
-            envdata = xr.open_dataset(envfile,
-                                      engine=engine,
-                                      decode_timedelta=True)
-            interp_values = envdata[key].interp(latitude=lat_coords,
-                                                longitude=lon_coords,
-                                                time=time_coords).values
-            self.envdata[key] = interp_values
-            tqdm.pandas(desc=f"Importing {key} data for TrajPoints",
-                        unit="point")
-            for i, point in tqdm(enumerate(
-                    self.traj_points[index[0]:index[1]]),
-                                 total=index[1] - index[0]):
-                point.setdata(key, interp_values[i])
-        print(f"Imported environment data '{key}' for all TrajPoints.")
+        keys = [key] if isinstance(key, str) else list(key)
+        times = self.arr['timestamp']
+        if times.dtype.kind != 'M':
+            times = pd.to_datetime(times).to_numpy()
+        queries = np.column_stack([
+            times.astype('datetime64[ns]').astype(np.float64),
+            self.arr['latitude'], self.arr['longitude']
+        ])
+        # Only the grid window around the track is read from disk
+        bounds = None
+        if np.isfinite(queries).any(axis=0).all():
+            bounds = tuple(
+                float(bound) for column in queries.T
+                for bound in (np.nanmin(column), np.nanmax(column)))
+        # One interpolation pass yields an (N, len(keys)) block
+        values = load_interpolator(envfile, engine, tuple(keys),
+                                   bounds)(queries)
+        for k, column in zip(keys, np.ascontiguousarray(values.T)):
+            self.envdata[k] = column
+        self.env_dataset = load_env(envfile, engine)
+        print(f"Imported environment data {keys} for all TrajPoints.")
+
+    def step(self, disp: np.ndarray, dt: float) -> 'Trajectory':
+        """
+        Advance every point at once, the batch form of TrajPoint.follow.
+        :param disp: (N, 2) array of [dx, dy] displacements in m, or one
+            [dx, dy] pair shared by all points.
+        :param dt: Time step in s, fractions are kept to the millisecond.
+        :return: New Trajectory holding the advanced points.
+        """
+        disp = np.asarray(disp, dtype=np.float64)
+        new_lat, new_lon = displacement_to_latlon_vec(self.arr['latitude'],
+                                                      self.arr['longitude'],
+                                                      disp[..., 0],
+                                                      disp[..., 1])
+        stepped = Trajectory(traj_points=[])
+        stepped.arr = {
+            'latitude': new_lat,
+            'longitude': new_lon,
+            # Millisecond steps, int(dt) would turn a 0.5 s step into 0
+            'timestamp':
+            self.arr['timestamp'] + np.timedelta64(int(round(dt * 1e3)), 'ms')
+        }
+        return stepped
 
     def adhere(self, Traj: 'Trajectory'):
         """
@@ -371,11 +486,17 @@ class Trajectory:
         #TODO: Implement adherence logic
         if not isinstance(Traj, Trajectory):
             raise TypeError("Trajectory must be an instance of 'Trajectory'.")
-        self.traj_points.extend(Traj.traj_points)
-        self.data_info = self.traj2info(self.sheet_path)
-        self.continuous_chunk_list += Traj.continuous_chunk_list
-        self.chunk_datapath_list += Traj.chunk_datapath_list
-        print(f"Adhered {len(Traj.traj_points)} points to the trajectory.")
+        # Only columns present in both trajectories stay aligned
+        self.arr = {
+            key: np.concatenate([self.arr[key], Traj.arr[key]])
+            for key in self.arr if key in Traj.arr
+        }
+        self.envdata = {
+            key: np.concatenate([self.envdata[key], Traj.envdata[key]])
+            for key in self.envdata if key in Traj.envdata
+        }
+        self.chunks += Traj.chunks
+        print(f"Adhered {len(Traj)} points to the trajectory.")
 
     def chunk2index(self):
         """
@@ -398,49 +519,53 @@ class Trajectory:
         :return: TrajPoint object at the specified index.
         """
         if isinstance(identifier, int):
-            return self.traj_points[identifier]
+            if identifier < 0:
+                identifier += len(self)
+            if identifier < 0 or identifier >= len(self):
+                raise IndexError(
+                    f"Index {identifier} out of range for trajectory length {len(self)}"
+                )
+            return TrajPointView(self, identifier)
         elif isinstance(identifier, str):
-            result = []
             if identifier in self.envdata:
-                result.extend(self.envdata[identifier])
-                return np.array(result)
-            for chunk in self.chunks:
-                if identifier not in chunk.cfg.header:
-                    raise KeyError(
-                        f"Identifier '{identifier}' not found in trajectory chunks."
-                    )
-                else:
-                    result.extend(chunk.get_data(identifier))
-            result = np.array(result)
-            if len(result) == 1:
-                return result[0]
-            elif len(result) == 0:
-                raise KeyError(f"No TrajPoint found with key '{identifier}'.")
-            else:
-                return result
+                return self.envdata[identifier]
+            if identifier in self.arr:
+                return self.arr[identifier]
+            raise KeyError(
+                f"Identifier '{identifier}' not found in trajectory data.")
         elif isinstance(identifier, list):
             print('Creating a new Trajectory subset with specified indices.')
             if not all(isinstance(i, int) for i in identifier):
                 raise ValueError(
                     "Identifier must be a list of integer indices.")
-            if any(i < 0 or i >= len(self.traj_points) for i in identifier):
+            if any(i < 0 or i >= len(self) for i in identifier):
                 raise IndexError(
                     "Identifier indices are out of bounds for the trajectory.")
-            # Create a new Trajectory object with the specified points
-            # This assumes TrajPoint objects are hashable and can be used in a list
-            return Trajectory(
-                traj_points=[self.traj_points[i] for i in identifier])
+            # Create a new Trajectory object with the specified rows
+            subset = Trajectory(traj_points=[])
+            subset.arr = {key: col[identifier] for key, col in self.arr.items()}
+            subset.envdata = {
+                key: col[identifier]
+                for key, col in self.envdata.items()
+            }
+            subset.env_dataset = self.env_dataset
+            return subset
         else:
             raise TypeError(
                 "Identifier must be an integer index, a string key, or a list of indices."
             )
 
+    def __len__(self):
+        if 'latitude' not in self.arr:
+            return 0
+        return len(self.arr['latitude'])
+
     def __iter__(self):
         """
         Make the Traj object iterable.
         :return: Iterator over TrajPoint objects.
         """
-        return iter(self.traj_points)
+        return (TrajPointView(self, i) for i in range(len(self)))
 
     def __str__(self):
-        return f"Trajectory with {len(self.traj_points)} points"
+        return f"Trajectory with {len(self)} points"
@@ -1,10 +1,23 @@
 import yaml
+from functools import lru_cache
+from pathlib import Path
 from yacs.config import CfgNode as CN
 
+# libyaml C loader when available, pure Python otherwise
+_SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 
-def build_cfg(yaml_path):
 
+@lru_cache(maxsize=32)
+def _load(yaml_path: str, mtime: float) -> CN:
+    # mtime is part of the key, so an edited file is parsed again
     with open(yaml_path, 'r') as f:
-        cfg = CN(yaml.safe_load(f))
+        return CN(yaml.load(f, Loader=_SafeLoader))
+
+
+def build_cfg(yaml_path):
+
+    mtime = Path(yaml_path).stat().st_mtime
+    # Callers mutate their cfg, hand out a copy of the cached parse
+    cfg = _load(str(yaml_path), mtime).clone()
     cfg.yamlpath = yaml_path
     return cfg
@@ -1,6 +1,13 @@
 import math
 import numpy as np
 
+# 地球半径，单位：米
+R_EARTH = 6371000
+# 标量路径的预计算系数：弧度/度，以及地表每米对应的度数
+_RAD_PER_DEG = math.pi / 180
+_DEG_PER_M = 180 / (math.pi * R_EARTH)
+_M_PER_DEG = math.pi * R_EARTH / 180
+
 
 def displacement_to_latlon(lat, lon, dx, dy):
     '''
@@ -13,49 +20,63 @@ def displacement_to_latlon(lat, lon, dx, dy):
     >>> displacement_to_latlon(39.9042, 116.4074, 1000, 1000)
     >>> (39.90420000000899, 116.41598600000012)
     '''
-    # 地球半径，单位：米
-    R = 6371000
-
-    # 将纬度和经度转换为弧度
-    lat_rad = math.radians(lat)
-    lon_rad = math.radians(lon)
+    # 数组输入走向量化版本, 标量保持math路径
+    if (isinstance(lat, np.ndarray) or isinstance(lon, np.ndarray)
+            or isinstance(dx, np.ndarray) or isinstance(dy, np.ndarray)):
+        return displacement_to_latlon_vec(lat, lon, dx, dy)
 
-    # 计算纬度上的变化
-    delta_lat = dy / R
-    delta_lat_deg = math.degrees(delta_lat)
+    # 北向位移直接换算为纬度变化(度)
+    final_lat = lat + dy * _DEG_PER_M
+    # 经度变化需要考虑纬度的影响
+    final_lon = lon + dx * _DEG_PER_M / math.cos(lat * _RAD_PER_DEG)
 
-    # 计算经度上的变化
-    # 需要考虑纬度对经度变化的影响
-    delta_lon = dx / (R * math.cos(lat_rad))
-    delta_lon_deg = math.degrees(delta_lon)
+    return final_lat, final_lon
 
-    # 计算最终的经纬度
-    final_lat = lat + delta_lat_deg
-    final_lon = lon + delta_lon_deg
 
+def displacement_to_latlon_vec(lat, lon, dx, dy):
+    '''
+    displacement_to_latlon 的数组版本，一次处理所有点
+    lat, lon: np.ndarray, 纬度/经度
+    dx, dy: np.ndarray, 东向/北向位移, m
+    return: tuple, (纬度数组, 经度数组)
+    '''
+    R = R_EARTH
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    final_lat = lat + np.degrees(np.asarray(dy) / R)
+    final_lon = lon + np.degrees(np.asarray(dx) / (R * np.cos(np.radians(lat))))
     return final_lat, final_lon
 
 
 def latlon_to_displacement(start_lat, start_lon, end_lat, end_lon):
-    # 地球半径，单位：米
-    R = 6371000
-
-    # 将经纬度转换为弧度
-    start_lat_rad = math.radians(start_lat)
-    start_lon_rad = math.radians(start_lon)
-    end_lat_rad = math.radians(end_lat)
-    end_lon_rad = math.radians(end_lon)
-
-    # 计算纬度和经度的变化量
-    delta_lat_rad = end_lat_rad - start_lat_rad
-    delta_lon_rad = end_lon_rad - start_lon_rad
+    # 数组输入走向量化版本, 标量保持math路径
+    if (isinstance(start_lat, np.ndarray) or isinstance(start_lon, np.ndarray)
+            or isinstance(end_lat, np.ndarray)
+            or isinstance(end_lon, np.ndarray)):
+        return latlon_to_displacement_vec(start_lat, start_lon, end_lat,
+                                          end_lon)
 
     # 计算北向的位移
-    dy = delta_lat_rad * R
+    dy = (end_lat - start_lat) * _M_PER_DEG
 
     # 计算东向的位移，考虑起点纬度
-    dx = delta_lon_rad * R * math.cos(start_lat_rad)
+    dx = (end_lon - start_lon) * _M_PER_DEG * math.cos(
+        start_lat * _RAD_PER_DEG)
+
+    return dx, dy
 
+
+def latlon_to_displacement_vec(start_lat, start_lon, end_lat, end_lon):
+    '''
+    latlon_to_displacement 的数组版本
+    return: tuple, (东向位移数组, 北向位移数组), m
+    '''
+    R = R_EARTH
+    start_lat_rad = np.radians(np.asarray(start_lat, dtype=np.float64))
+    dy = (np.radians(np.asarray(end_lat, dtype=np.float64)) - start_lat_rad) * R
+    dx = np.radians(
+        np.asarray(end_lon, dtype=np.float64) -
+        np.asarray(start_lon, dtype=np.float64)) * R * np.cos(start_lat_rad)
     return dx, dy
 
 
@@ -80,53 +101,17 @@ def angle_get(x, y):
     - 270度表示正西方向
     """
     # 将输入转换为numpy数组以支持数组运算
-    x = np.asarray(x)
-    y = np.asarray(y)
-
-    # 使用arctan计算初步角度（以度为单位）
-    # 注意：这里使用x/y而不是y/x，因为我们要计算从北方向的角度
-    with np.errstate(divide='ignore', invalid='ignore'):
-        angle_pre = np.degrees(np.arctan(x / y))
-
-    # 初始化结果数组，与输入数组形状相同
-    angle = np.zeros_like(angle_pre)
-
-    # 根据x和y的符号以及angle_pre的符号来确定所在象限，并计算正确的角度
-
-    # 第一象限：x>0, y>0, angle_pre>0
-    # 对应地理方位：东北方向，角度范围0-90度
-    ind1 = (angle_pre > 0) & (x > 0)
-    angle[ind1] = angle_pre[ind1]
-
-    # 第二象限：x>0, y<0, angle_pre<0
-    # 对应地理方位：东南方向，角度范围90-180度
-    ind2 = (angle_pre < 0) & (x > 0)
-    angle[ind2] = angle_pre[ind2] + 180
-
-    # 第三象限：x<0, y<0, angle_pre>0
-    # 对应地理方位：西南方向，角度范围180-270度
-    ind3 = (angle_pre > 0) & (x < 0)
-    angle[ind3] = angle_pre[ind3] + 180
-
-    # 第四象限：x<0, y>0, angle_pre<0
-    # 对应地理方位：西北方向，角度范围270-360度
-    ind4 = (angle_pre < 0) & (x < 0)
-    angle[ind4] = angle_pre[ind4] + 360
-
-    # 特殊情况：x=0, y<0，正南方向
-    ind5 = (x == 0) & (y < 0)
-    angle[ind5] = 180
-
-    # 处理其他特殊情况
-    # x=0, y>0：正北方向，角度为0度（默认值已经是0）
-    # x>0, y=0：正东方向，角度为90度
-    ind_east = (x > 0) & (y == 0)
-    angle[ind_east] = 90
-
-    # x<0, y=0：正西方向，角度为270度
-    ind_west = (x < 0) & (y == 0)
-    angle[ind_west] = 270
-
-    # x=0, y=0：未定义情况，保持为0
-
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # arctan2(x, y) 直接给出从北方向顺时针的角度(-180~180]，象限由ufunc处理
+    angle = np.degrees(np.arctan2(x, y),
+                       out=np.empty(np.broadcast(x, y).shape))
+    # 负角度（西侧）加360度，映射到0~360度
+    np.add(angle, 360, out=angle, where=angle < 0)
+
+    # x=0, y=0（含带符号的0）以及含NaN的输入：未定义情况，与原实现一致返回0
+    angle[np.isnan(angle) | ((x == 0) & (y == 0))] = 0
+    # -0.0 归为 0.0
+    angle += 0.0
     return angle
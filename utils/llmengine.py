@@ -1,61 +1,221 @@
+import asyncio
+import hashlib
 import openai
 import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
 from google.genai import types
 from google import genai
 from utils.cfg import build_cfg
 
+RESPONSE_CACHE_DIR = Path.home() / '.cache' / 'shiptrack' / 'llm' / 'responses'
+MEM_CACHE_SIZE = 256
+
 
 class LLMEngine:
+    OPENAI_URLS = {
+        'deepseek': 'https://api.deepseek.com',
+        'openai': 'https://api.openai.com',
+    }
+    _OPENAI_PREFIXES = tuple(OPENAI_URLS)
+    # 进程内响应缓存，所有实例共享，键已包含模型与采样参数
+    _mem_cache: OrderedDict[str, str] = OrderedDict()
+    # batch_headers与ThreadPoolExecutor会从多个线程同时读写_mem_cache
+    _mem_lock = threading.Lock()
 
     def __init__(self,
                  model_name: str = 'gemini-1.5-flex',
                  yaml_path: str = './llm/data.yaml'):
         self.model_name = model_name
+        self.enginelist = ['gemini', 'openai']
+        self.type = self.model_type()
+        # 不支持的模型在读取配置、创建客户端之前就报错
+        if self.type is None:
+            raise ValueError(f"Unsupported model type: {self.model_name}")
         self.yaml_path = yaml_path
         self.cfg = build_cfg(yaml_path)
         self.temperature = self.cfg.temperature if 'temperature' in self.cfg else 0.3
         self.top_p = self.cfg.top_p if 'top_p' in self.cfg else 0.95
-        self.OPENAI_URLS = {
-            'deepseek': 'https://api.deepseek.com',
-            'openai': 'https://api.openai.com',
-        }
-        self.enginelist = ['gemini', 'openai']
-        self.type = self.model_type()
+        # 客户端只创建一次，多次调用复用同一连接池
+        self._client = self.make_client()
+        # 异步客户端绑定事件循环，首次acall时再创建
+        self._aclient = None
 
     def model_type(self):
         if self.model_name.startswith('gemini'):
             return self.enginelist[0]
-        elif self.model_name.startswith(tuple(self.OPENAI_URLS.keys())):
+        elif self.model_name.startswith(self._OPENAI_PREFIXES):
             return self.enginelist[1]
 
-    def __call__(self, prompt: str):
+    def make_client(self):
+        if self.type == 'gemini':
+            return genai.Client()
+        elif self.type == 'openai':
+            return openai.OpenAI(api_key=os.getenv('DEEPSEEK_API_KEY'),
+                                 base_url=self.OPENAI_URLS['deepseek'])
+        return None
+
+    def make_aclient(self):
+        if self.type == 'gemini':
+            return self._client.aio
+        elif self.type == 'openai':
+            return openai.AsyncOpenAI(api_key=os.getenv('DEEPSEEK_API_KEY'),
+                                      base_url=self.OPENAI_URLS['deepseek'])
+        return None
+
+    def __call__(self,
+                 prompt: str,
+                 json_mode: bool = False,
+                 cache: bool = False):
+        """
+        json_mode: ask the model for a bare JSON object, no prose or code fences
+        cache: opt in to reusing an earlier answer to the same prompt, model
+        and sampling parameters instead of another round-trip. Answers are
+        stored as returned, callers that validate answers should keep their
+        own cache of validated ones instead.
+        """
+        # 空白提示词不值得一次网络往返
+        if not prompt or not prompt.strip():
+            return ""
+        key = self._cache_key(prompt, json_mode)
+        if cache:
+            response = self._cache_get(key)
+            if response is not None:
+                return response
+        if self.type == 'gemini':
+            response = self.call_gemini(prompt, json_mode)
+        elif self.type == 'openai':
+            response = self.call_openai(prompt, json_mode)
+        else:
+            raise ValueError(f"Unsupported model type: {self.model_name}")
+        if cache:
+            self._cache_put(key, response)
+        return response
+
+    async def acall(self,
+                    prompt: str,
+                    json_mode: bool = False,
+                    cache: bool = False):
+        """
+        Async counterpart of __call__, for overlapping several requests
+        """
+        # 空白提示词不值得一次网络往返
+        if not prompt or not prompt.strip():
+            return ""
+        key = self._cache_key(prompt, json_mode)
+        if cache:
+            response = self._cache_get(key)
+            if response is not None:
+                return response
+        if self._aclient is None:
+            self._aclient = self.make_aclient()
         if self.type == 'gemini':
-            return self.call_gemini(prompt)
+            response = (await self._aclient.models.generate_content(
+                **self._gemini_request(prompt, json_mode))).text
         elif self.type == 'openai':
-            return self.call_openai(prompt)
+            response = await self._aclient.chat.completions.create(
+                **self._openai_request(prompt, json_mode))
+            response = response.choices[
+                0].message.content if response.choices else ""
         else:
             raise ValueError(f"Unsupported model type: {self.model_name}")
+        if cache:
+            self._cache_put(key, response)
+        return response
+
+    def _cache_key(self, prompt: str, json_mode: bool) -> str:
+        return hashlib.sha256(
+            f"{self.model_name}|{self.temperature}|{self.top_p}|{json_mode}|{prompt}"
+            .encode('utf-8')).hexdigest()
+
+    def _cache_get(self, key: str):
+        """Looks a response up in memory, then on disk. None on a miss."""
+        with self._mem_lock:
+            response = self._mem_cache.get(key)
+            if response is not None:
+                self._mem_cache.move_to_end(key)
+                return response
+        path = RESPONSE_CACHE_DIR / f"{key}.txt"
+        if path.exists():
+            response = path.read_text(encoding='utf-8')
+            self._remember(key, response)
+            return response
+        return None
+
+    def _cache_put(self, key: str, response: str):
+        # 空回答多半是失败，不缓存
+        if not response:
+            return
+        self._remember(key, response)
+        RESPONSE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESPONSE_CACHE_DIR / f"{key}.txt"
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(response, encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def _remember(cls, key: str, response: str):
+        with cls._mem_lock:
+            cls._mem_cache[key] = response
+            cls._mem_cache.move_to_end(key)
+            # 超出容量时丢弃最久未用的一条
+            if len(cls._mem_cache) > MEM_CACHE_SIZE:
+                cls._mem_cache.popitem(last=False)
+
+    def batch(self,
+              prompts: list[str],
+              json_mode: bool = False,
+              max_concurrency: int = 8,
+              cache: bool = False) -> list[str]:
+        """
+        Sends several prompts concurrently, answers are returned in order.
+        At most max_concurrency requests are in flight at once.
+        """
+
+        async def run():
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def one(prompt):
+                async with semaphore:
+                    return await self.acall(prompt, json_mode, cache)
+
+            try:
+                return await asyncio.gather(*(one(p) for p in prompts))
+            finally:
+                # 连接池属于这次asyncio.run的事件循环，结束后丢弃
+                self._aclient = None
+
+        return list(asyncio.run(run()))
+
+    def _gemini_request(self, prompt: str, json_mode: bool = False) -> dict:
+        return dict(model=self.model_name,
+                    contents=prompt,
+                    config=types.GenerateContentConfig(
+                        thinking_config=types.ThinkingConfig(thinking_budget=0),
+                        temperature=self.temperature,
+                        top_p=self.top_p,
+                        response_mime_type='application/json'
+                        if json_mode else None))
+
+    def _openai_request(self, prompt: str, json_mode: bool = False) -> dict:
+        return dict(model=self.model_name,
+                    messages=[{
+                        "role": "user",
+                        "content": prompt
+                    }],
+                    stream=False,
+                    temperature=self.temperature,
+                    top_p=self.top_p,
+                    response_format={'type': 'json_object'}
+                    if json_mode else openai.NOT_GIVEN)
 
-    def call_gemini(self, prompt: str):
-        client = genai.Client()
-        response = client.models.generate_content(
-            model=self.model_name,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=0),
-                temperature=self.temperature,
-                top_p=self.top_p))
+    def call_gemini(self, prompt: str, json_mode: bool = False):
+        response = self._client.models.generate_content(
+            **self._gemini_request(prompt, json_mode))
         return response.text
 
-    def call_openai(self, prompt: str):
-        client = openai.OpenAI(api_key=os.getenv('DEEPSEEK_API_KEY'),
-                               base_url='https://api.deepseek.com')
-        response = client.chat.completions.create(model=self.model_name,
-                                                  messages=[{
-                                                      "role": "user",
-                                                      "content": prompt
-                                                  }],
-                                                  stream=False,
-                                                  temperature=self.temperature,
-                                                  top_p=self.top_p)
+    def call_openai(self, prompt: str, json_mode: bool = False):
+        response = self._client.chat.completions.create(
+            **self._openai_request(prompt, json_mode))
         return response.choices[0].message.content if response.choices else ""
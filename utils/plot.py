@@ -1,10 +1,18 @@
-from scipy.stats import spearmanr
+import hashlib
+import os
+from scipy.stats import rankdata
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
 import seaborn as sns
 from utils.geo import angle_get
 from track.traj import Trajectory
 
+# 设置更好的图形样式，导入时设置一次，不在每次绘图时重新加载
+plt.style.use('seaborn-v0_8')
+sns.set_palette("husl")
+
 
 def angular_difference(a, b):
     """计算两个角度 (0-360) 之间的最小差异 (-180 to 180)"""
@@ -12,44 +20,127 @@ def angular_difference(a, b):
     return diff
 
 
+def _speed_rme(pred, obs, out=None):
+    """风速相对误差 |pred - obs| / obs, 复用同一缓冲区原地计算"""
+    out = np.subtract(pred, obs, out=out)
+    np.abs(out, out=out)
+    np.divide(out, obs, out=out)
+    return out
+
+
+def _dir_rme(pred, obs, out=None):
+    """风向相对误差 |angular_difference(pred, obs)| / 180, 原地计算避免中间数组"""
+    out = np.subtract(pred, obs, out=out)
+    out += 180
+    np.mod(out, 360, out=out)
+    out -= 180
+    np.abs(out, out=out)
+    out /= 180
+    return out
+
+
 # 定义百分比区间和对应颜色
+# 区间右端点, np.digitize(right=True) 给出 ≤10%, 10-30%, 30-50%, >50% 四档
+_EDGES = np.array([0.1, 0.3, 0.5])
+# RGBA调色板：绿、黄、橙、红，最后一行为NaN使用的默认灰色
+_PALETTE = np.array([
+    [0.0, 1.0, 0.0, 1.0],  # 绿色：<=10%
+    [1.0, 1.0, 0.0, 1.0],  # 黄色：10%-30%
+    [1.0, 165 / 255, 0.0, 1.0],  # 橙色：30%-50%
+    [1.0, 0.0, 0.0, 1.0],  # 红色：>50%
+    [0.8, 0.8, 0.8, 1.0],  # 灰色：NaN
+])
+
+# RME参考线颜色及图例句柄，图例句柄只在导入时创建一次
+_REF_COLORS = ['green', 'yellow', 'orange']
+_REF_HANDLES = [
+    Line2D([], [], color=color, linestyle='--', alpha=0.8, label=f'{edge:.0%}')
+    for edge, color in zip(_EDGES, _REF_COLORS)
+]
+
+
 def get_color_by_percentage(data):
-    """根据百分比值返回对应颜色"""
-    colors = np.full(len(data), '#CCCCCC')  # 默认灰色
-    colors[data <= 0.1] = '#00FF00'  # 绿色：<=10%
-    colors[(data > 0.1) & (data <= 0.3)] = '#FFFF00'  # 黄色：10%-30%
-    colors[(data > 0.3) & (data <= 0.5)] = '#FFA500'  # 橙色：30%-50%
-    colors[data > 0.5] = '#FF0000'  # 红色：>50%
-    return colors
+    """根据百分比值返回对应颜色, (N, 4) RGBA数组"""
+    idx = np.digitize(data, _EDGES, right=True)
+    idx[np.isnan(data)] = len(_PALETTE) - 1
+    return _PALETTE[idx]
 
 
 def get_wind_profile(traj: Trajectory, reverse: bool = False):
-    sen_w = traj['true_wind_speed'] * 0.5144
-    sen_w_dir = (traj['true_wind_direction'] + 180 * reverse) % 360
-    u10 = traj['u10']
-    v10 = traj['v10']
-    u100 = traj['u100']
-    v100 = traj['v100']
-    w10 = traj['w10']
-    w100 = traj['w100']
-    w10_dir = angle_get(u10, v10)
-    w100_dir = angle_get(u100, v100)
+    """
+    返回 sen_w, sen_w_dir, w10, w100, w10_dir, w100_dir, 均为float32副本。
+    """
+    sen_w_speed = traj['true_wind_speed']
+    sen_w_angle = traj['true_wind_direction']
+    # 绘图与统计只需float32精度，数据量减半
+    sen_w = (sen_w_speed * 0.5144).astype(np.float32)
+    sen_w_dir = ((sen_w_angle + 180 * reverse) % 360).astype(np.float32)
+    w10 = traj['w10'].astype(np.float32)
+    w100 = traj['w100'].astype(np.float32)
+    # 两个高度的风向堆叠成(2, N)一次计算，沿用angle_get的约定(NaN与零风速取0)
+    w10_dir, w100_dir = angle_get(np.stack([traj['u10'], traj['u100']]),
+                                  np.stack([traj['v10'], traj['v100']
+                                            ])).astype(np.float32)
     return sen_w, sen_w_dir, w10, w100, w10_dir, w100_dir
 
 
+def _get_fig(figsize):
+    """
+    按尺寸复用同一个pyplot Figure, 清空后设为当前图形返回。
+    批量绘图时打开的图形数量恒定，不必每次重建画布。
+    """
+    num = 'x'.join(map(str, figsize))
+    if plt.fignum_exists(num):
+        fig = plt.figure(num)
+        fig.clf()
+        return fig
+    return plt.figure(num=num, figsize=figsize)
+
+
+def _input_signature(*inputs) -> str:
+    """对绘图输入（数组或标签文本）做sha256，作为输出图像的内容签名"""
+    h = hashlib.sha256()
+    for item in inputs:
+        if isinstance(item, str):
+            h.update(item.encode('utf-8'))
+        else:
+            item = np.ascontiguousarray(item)
+            h.update(f'{item.dtype}{item.shape}'.encode('utf-8'))
+            h.update(item.tobytes())
+    return h.hexdigest()
+
+
+def _inputs_unchanged(path: str, signature: str) -> bool:
+    """图像已存在且旁边的.sha256与本次输入一致时返回True, 可跳过重绘"""
+    sig_path = path + '.sha256'
+    if not (os.path.exists(path) and os.path.exists(sig_path)):
+        return False
+    with open(sig_path, encoding='utf-8') as f:
+        return f.read() == signature
+
+
+def _savefig(path: str, signature: str, **kwargs):
+    """保存当前图形并写入输入签名"""
+    plt.savefig(path, **kwargs)
+    with open(path + '.sha256', 'w', encoding='utf-8') as f:
+        f.write(signature)
+
+
 def plot_series(timedata, dict: dict, route_name: str, type: str):
 
-    plt.figure(figsize=(10, 4))
+    save_path = f'./figure/wind_comparison_{type}_{route_name}.png'
+    signature = _input_signature(timedata, *dict.keys(), *dict.values())
+    if _inputs_unchanged(save_path, signature):
+        return
+    _get_fig((10, 4))
     for label, series in dict.items():
-        plt.plot(timedata, series, label=label)
+        plt.plot(timedata, series, label=label, rasterized=True)
     plt.xlabel('Time Index')
     plt.ylabel('Wind Speed (m/s)')
     plt.title('Wind Speed Scatter Plot')
     plt.legend()
     plt.grid(True)
-    plt.savefig(f'./figure/wind_comparison_{type}_{route_name}.png',
-                dpi=300,
-                bbox_inches='tight')
+    _savefig(save_path, signature, dpi=300, bbox_inches='tight')
 
 
 def plot_wind_profile(sen_w, w10, w100, sen_w_dir, w10_dir, w100_dir,
@@ -80,111 +171,117 @@ def plot_wind_profile(sen_w, w10, w100, sen_w_dir, w10_dir, w100_dir,
 
 def calculate_percentage_distribution(data):
     """计算各百分比区间的分布"""
-    total = len(data)
-    p10 = np.sum(data <= 0.1) / total * 100
-    p30 = np.sum((data > 0.1) & (data <= 0.3)) / total * 100
-    p50 = np.sum((data > 0.3) & (data <= 0.5)) / total * 100
-    p_above50 = np.sum(data > 0.5) / total * 100
-    return [p10, p30, p50, p_above50]
-    # Process each segment
+    return _percentage_distributions(np.asarray(data)[None])[0].tolist()
+
+
+def _percentage_distributions(rows):
+    """
+    对二维数组逐行计算百分比分布，返回(行数, 4)。
+    各行bin编号错开后合并成一次bincount，所有序列只扫描一遍。
+    """
+    # 与get_color_by_percentage同一分箱，NaN计入总数但不属于任何区间
+    nbins = len(_PALETTE)
+    idx = np.digitize(rows, _EDGES, right=True)
+    idx[np.isnan(rows)] = nbins - 1
+    idx += np.arange(len(rows))[:, None] * nbins
+    counts = np.bincount(idx.ravel(), minlength=len(rows) * nbins)
+    counts = counts.reshape(len(rows), nbins)[:, :len(_EDGES) + 1]
+    return counts / rows.shape[1] * 100
 
 
 def plot_analyzed_route(sen_w, sen_w_dir, w10, w100, w10_dir, w100_dir,
                         route_name: str):
 
-    slice_sensor_wind = sen_w
-    slice_sensor_wind_direction = sen_w_dir
-    slice_w10 = w10
-    slice_w100 = w100
-    slice_w10_dir = w10_dir
-    slice_w100_dir = w100_dir
-
-    not_nan_mask = ~np.isnan(slice_sensor_wind) & ~np.isnan(
-        slice_w10) & ~np.isnan(slice_w100) & ~np.isnan(
-            slice_sensor_wind_direction) & ~np.isnan(
-                slice_w10_dir) & ~np.isnan(slice_w100_dir)
-    slice_sensor_wind = slice_sensor_wind[not_nan_mask]
-    slice_sensor_wind_direction = slice_sensor_wind_direction[not_nan_mask]
-    slice_w10 = slice_w10[not_nan_mask]
-    slice_w100 = slice_w100[not_nan_mask]
-    slice_w10_dir = slice_w10_dir[not_nan_mask]
-    slice_w100_dir = slice_w100_dir[not_nan_mask]
+    # 六列堆叠后一次isnan，任一列为NaN的时刻整体剔除
+    arrs = [sen_w, sen_w_dir, w10, w100, w10_dir, w100_dir]
+    not_nan_mask = ~np.isnan(np.stack(arrs, axis=1)).any(axis=1)
+    (slice_sensor_wind, slice_sensor_wind_direction, slice_w10, slice_w100,
+     slice_w10_dir, slice_w100_dir) = [a[not_nan_mask] for a in arrs]
 
     # Calculate Spearman correlation
-    s_sensor_w10 = spearmanr(slice_sensor_wind, slice_w10)[0]
-    s_sensor_w100 = spearmanr(slice_sensor_wind, slice_w100)[0]
-    s_sensor_w10_dir = spearmanr(slice_sensor_wind_direction, slice_w10_dir)[0]
-    s_sensor_w100_dir = spearmanr(slice_sensor_wind_direction,
-                                  slice_w100_dir)[0]
-    s_w10_w100 = spearmanr(slice_w10, slice_w100)[0]
-    s_w10_dir_w100_dir = spearmanr(slice_w10_dir, slice_w100_dir)[0]
+    # 每列只排序一次，一次corrcoef得到所有两两相关系数，不计算p值
+    ranks = rankdata(np.column_stack([
+        slice_sensor_wind, slice_w10, slice_w100, slice_sensor_wind_direction,
+        slice_w10_dir, slice_w100_dir
+    ]),
+                     axis=0)
+    corr = np.corrcoef(ranks, rowvar=False)
+    s_sensor_w10 = corr[0, 1]
+    s_sensor_w100 = corr[0, 2]
+    s_sensor_w10_dir = corr[3, 4]
+    s_sensor_w100_dir = corr[3, 5]
+    s_w10_w100 = corr[1, 2]
+    s_w10_dir_w100_dir = corr[4, 5]
     print(
         f"Route: {route_name}, "
         f"Sens-W10: {s_sensor_w10:.4f}, Sens-W100: {s_sensor_w100:.4f}, "
         f"Sens-W10 Dir: {s_sensor_w10_dir:.4f}, Sens-W100 Dir: {s_sensor_w100_dir:.4f}, "
         f"W10-W100: {s_w10_w100:.4f}, W10 Dir-W100 Dir: {s_w10_dir_w100_dir:.4f}"
     )
-    w10_rme = np.abs(slice_w10 - slice_sensor_wind) / slice_sensor_wind
-    w100_rme = np.abs(slice_w100 - slice_sensor_wind) / slice_sensor_wind
-    w10_dir_rme = np.abs(
-        angular_difference(slice_w10_dir, slice_sensor_wind_direction)) / 180
-    w100_dir_rme = np.abs(
-        angular_difference(slice_w100_dir, slice_sensor_wind_direction)) / 180
-    rmes = {
-        'w10_rme': w10_rme,
-        'w100_rme': w100_rme,
-        'w10_dir_rme': w10_dir_rme,
-        'w100_dir_rme': w100_dir_rme
-    }
-
-    # 设置更好的图形样式
-    plt.style.use('seaborn-v0_8')
-    sns.set_palette("husl")
+    # 四条RME序列按行存放在一个(4, N) float32数组中：W10, W100, W10风向, W100风向
+    rme = np.empty((4, len(slice_sensor_wind)), dtype=np.float32)
+    _speed_rme(slice_w10, slice_sensor_wind, out=rme[0])
+    _speed_rme(slice_w100, slice_sensor_wind, out=rme[1])
+    _dir_rme(slice_w10_dir, slice_sensor_wind_direction, out=rme[2])
+    _dir_rme(slice_w100_dir, slice_sensor_wind_direction, out=rme[3])
+    distributions = _percentage_distributions(rme)
+
+    # 输入未变且图像已存在时不再重绘，相关系数仍照常输出
+    save_path = f'./figure/rme_analysis_{route_name}.png'
+    signature = _input_signature(sen_w, sen_w_dir, w10, w100, w10_dir,
+                                 w100_dir)
+    if _inputs_unchanged(save_path, signature):
+        return
 
     # 创建图形：2x3布局（左边4个RME图，右边2个饼图）
-    fig = plt.figure(figsize=(24, 14))
+    fig = _get_fig((24, 14))
     fig.suptitle(f'Wind Data RME Analysis - Route: {route_name}',
                  fontsize=20,
                  fontweight='bold')
 
     # 数据配置
     data_configs = [
-        (w10_rme, 'W10 RME', 'darkred'),
-        (w100_rme, 'W100 RME', 'darkgreen'),
-        (w10_dir_rme, 'W10 Direction RME', 'darkblue'),
-        (w100_dir_rme, 'W100 Direction RME', 'darkorange'),
+        (rme[0], 'W10 RME', 'darkred'),
+        (rme[1], 'W100 RME', 'darkgreen'),
+        (rme[2], 'W10 Direction RME', 'darkblue'),
+        (rme[3], 'W100 Direction RME', 'darkorange'),
     ]
 
     # 绘制RME时间序列图
+    time_index = np.arange(len(slice_sensor_wind))
     for idx, (data, title, main_color) in enumerate(data_configs):
         ax = plt.subplot(2, 3, idx + 1)
 
         # 获取颜色数组
         colors = get_color_by_percentage(data)
 
-        # 绘制散点图，每个点根据RME值着色
-        for j in range(len(data)):
-            ax.scatter(j, data[j], c=colors[j], s=20, alpha=0.7)
-
-        # 绘制连线
-        ax.plot(data, color=main_color, linewidth=1.5, alpha=0.6)
-
-        # 添加水平参考线
-        ax.axhline(y=0.1,
-                   color='green',
-                   linestyle='--',
-                   alpha=0.8,
-                   label='10%')
-        ax.axhline(y=0.3,
-                   color='yellow',
-                   linestyle='--',
-                   alpha=0.8,
-                   label='30%')
-        ax.axhline(y=0.5,
-                   color='orange',
-                   linestyle='--',
-                   alpha=0.8,
-                   label='50%')
+        # 绘制散点图，每个点根据RME值着色，一次调用生成一个PathCollection
+        # 数据点栅格化输出，文字与图例仍为矢量
+        ax.scatter(time_index,
+                   data,
+                   c=colors,
+                   s=20,
+                   alpha=0.7,
+                   rasterized=True)
+
+        # 绘制连线，相邻点组成线段，一个LineCollection承载全部线段
+        points = np.column_stack([time_index, data])
+        ax.add_collection(
+            LineCollection(np.stack([points[:-1], points[1:]], axis=1),
+                           colors=main_color,
+                           linewidths=1.5,
+                           alpha=0.6,
+                           zorder=2,
+                           rasterized=True))
+        ax.autoscale_view()
+
+        # 添加水平参考线，三条线由一个hlines集合绘制
+        ax.hlines(_EDGES,
+                  0,
+                  len(data) - 1,
+                  colors=_REF_COLORS,
+                  linestyles='--',
+                  alpha=0.8)
 
         # 设置图形属性
         ax.set_ylim(0, min(1, np.percentile(data, 95) * 1.1))
@@ -192,10 +289,10 @@ def plot_analyzed_route(sen_w, sen_w_dir, w10, w100, w10_dir, w100_dir,
         ax.set_xlabel('Time Index', fontsize=16)
         ax.set_ylabel('RME', fontsize=16)
         ax.grid(True, alpha=0.3, linestyle='-', linewidth=0.5)
-        ax.legend(fontsize=16)
+        ax.legend(handles=_REF_HANDLES, fontsize=16)
 
         # 添加统计信息文本框
-        percentages = calculate_percentage_distribution(data)
+        percentages = distributions[idx]
         stats_text = (f'≤10%: {percentages[0]:.1f}%\n'
                       f'10-30%: {percentages[1]:.1f}%\n'
                       f'30-50%: {percentages[2]:.1f}%\n'
@@ -210,8 +307,8 @@ def plot_analyzed_route(sen_w, sen_w_dir, w10, w100, w10_dir, w100_dir,
 
     # 绘制风速RME综合饼图
     ax_pie1 = plt.subplot(2, 3, 5)
-    wind_speed_data = np.concatenate([rmes['w10_rme'], rmes['w100_rme']])
-    wind_speed_percentages = calculate_percentage_distribution(wind_speed_data)
+    # 各RME序列经同一NaN掩码后等长，合并分布即两者分布的平均
+    wind_speed_percentages = distributions[:2].mean(axis=0)
 
     labels = ['≤10%', '10-30%', '30-50%', '>50%']
     colors_pie = ['#00FF00', '#FFFF00', '#FFA500', '#FF0000']
@@ -227,8 +324,7 @@ def plot_analyzed_route(sen_w, sen_w_dir, w10, w100, w10_dir, w100_dir,
 
     # 绘制风向RME综合饼图
     ax_pie2 = plt.subplot(2, 3, 6)
-    wind_dir_data = np.concatenate([rmes['w10_dir_rme'], rmes['w100_dir_rme']])
-    wind_dir_percentages = calculate_percentage_distribution(wind_dir_data)
+    wind_dir_percentages = distributions[2:].mean(axis=0)
 
     wedges, texts, autotexts = ax_pie2.pie(wind_dir_percentages,
                                            labels=labels,
@@ -240,10 +336,11 @@ def plot_analyzed_route(sen_w, sen_w_dir, w10, w100, w10_dir, w100_dir,
                       fontweight='bold')
 
     plt.tight_layout()
-    plt.savefig(f'./figure/rme_analysis_{route_name}.png',
-                format='png',
-                dpi=300,
-                bbox_inches='tight')
+    _savefig(save_path,
+             signature,
+             format='png',
+             dpi=300,
+             bbox_inches='tight')
 
 
 def plot_2d_polar_wind_timeseries(time_steps,
@@ -261,12 +358,17 @@ def plot_2d_polar_wind_timeseries(time_steps,
     title (str): 图表标题。
     save_path (str, optional): 保存图像的文件路径。如果为None，则只显示图像。
     """
+    if save_path:
+        signature = _input_signature(time_steps, title,
+                                     *directions_data.keys(),
+                                     *directions_data.values())
+        if _inputs_unchanged(save_path, signature):
+            return
+
     # --- 1. 创建极坐标图形 ---
-    # subplot_kw={'projection': 'polar'} 是创建极坐标图的关键
-    plt.style.use('seaborn-v0_8')
-    sns.set_palette("husl")
-    fig, ax = plt.subplots(figsize=(12, 12),
-                           subplot_kw={'projection': 'polar'})
+    # projection='polar' 是创建极坐标图的关键
+    fig = _get_fig((12, 12))
+    ax = fig.add_subplot(projection='polar')
 
     # --- 2. 循环绘制每个风向序列 ---
     # 使用预定义的颜色列表来区分不同的序列
@@ -287,10 +389,16 @@ def plot_2d_polar_wind_timeseries(time_steps,
                    s=60,
                    alpha=0.7,
                    color=colors[i],
-                   zorder=i + 2)
+                   zorder=i + 2,
+                   rasterized=True)
 
         # 绘制连接线以显示时间演进
-        ax.plot(theta_rad, r, alpha=0.5, color=colors[i], zorder=i + 1)
+        ax.plot(theta_rad,
+                r,
+                alpha=0.5,
+                color=colors[i],
+                zorder=i + 1,
+                rasterized=True)
 
     # --- 3. 美化与标注坐标轴 ---
     # 设置角度（theta）轴，使其像一个罗盘
@@ -316,4 +424,8 @@ def plot_2d_polar_wind_timeseries(time_steps,
 
     # --- 4. 保存或显示图像 ---
     if save_path:
-        plt.savefig(save_path, format='png', dpi=300, bbox_inches='tight')
+        _savefig(save_path,
+                 signature,
+                 format='png',
+                 dpi=300,
+                 bbox_inches='tight')